@@ -0,0 +1,288 @@
+"""
+Benchmark the analysis tools on a synthetic capture archive (see make_synthetic_dataset.py).
+
+Each tool runs in its own child process so peak RSS is measured per tool:
+
+  mix        create_images_memory_efficient.run_mix over the whole range (with camera)
+  vectorize  vectorize_screenshots.main into a temporary output directory
+  face       FaceAnalyzer.analyze on every camera photo
+  frames     the player's /api/frames endpoint over HTTP
+
+Latencies: mix times each timestamp's load (read + decode of all its images) in the
+worker threads, vectorize times each encode_batch call divided by its number of images,
+face and frames time single calls.
+
+Results are compared against analysis/bench_baselines.json (if present); a tool whose
+throughput drops, or whose peak RSS grows, by more than the tolerance is reported as a
+regression and the exit code is 1. Use --save-baseline to record the current numbers.
+
+Usage:
+  python benchmark.py [--tools mix,frames] [--days 2 --frames 60] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent
+BENCH_DATA_DIR = SCRIPT_DIR / "bench_data"
+BASELINES_PATH = SCRIPT_DIR / "bench_baselines.json"
+TOOLS = ("mix", "vectorize", "face", "frames")
+TOLERANCE = 0.2
+FRAMES_REPEAT = 20
+NUM_THREADS = 8
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 2**20
+
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KiB on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def list_dates(root: Path) -> list[str]:
+    from day_archive import ARCHIVE_SUFFIX
+
+    return sorted({d.name.removesuffix(ARCHIVE_SUFFIX) for d in (root / "screenCap").iterdir() if d.is_dir()})
+
+
+# ---- tools (run in the child process) -----------------------------------------
+
+
+def timed(func, latencies: list, items=lambda args, result: 1):
+    """func, appending its duration per item to latencies on every call (thread-safe)."""
+
+    def wrapper(*args):
+        t = time.perf_counter()
+        result = func(*args)
+        n = items(args, result)
+        if n:
+            latencies.append((time.perf_counter() - t) / n)
+        return result
+
+    return wrapper
+
+
+def bench_mix(root: Path, workdir: str) -> dict:
+    import create_images_memory_efficient as ci
+
+    ci.PHOTOS_PATH = str(root / "cameraCap")
+    ci.SCREENSHOTS_PATH = str(root / "screenCap")
+    ci.OUTPUT_PATH = workdir
+    latencies = []
+    ci.process_single_image = timed(ci.process_single_image, latencies)
+    dates = list_dates(root)
+    start, end = date.fromisoformat(dates[0]), date.fromisoformat(dates[-1])
+    t0 = time.perf_counter()
+    count = ci.run_mix(start, end, True, 50, NUM_THREADS)
+    return {"items": count, "seconds": time.perf_counter() - t0, "latencies": latencies}
+
+
+def bench_vectorize(root: Path, workdir: str) -> dict:
+    import vectorize_screenshots as vs
+
+    vs.SCREENCAP_DIR = root / "screenCap"
+    vs.OUTPUT_DIR = Path(workdir) / "embeddings"
+    count = len(vs.collect_images(vs.SCREENCAP_DIR))
+    latencies = []
+    vs.encode_batch = timed(vs.encode_batch, latencies, lambda args, result: len(result[1]))
+    t0 = time.perf_counter()
+    vs.main()
+    return {"items": count, "seconds": time.perf_counter() - t0, "latencies": latencies}
+
+
+def bench_face(root: Path, workdir: str) -> dict:
+    from face_analyzer import FaceAnalyzer
+
+    latencies = []
+    with FaceAnalyzer() as analyzer:
+        t0 = time.perf_counter()
+        for day in list_dates(root):
+            folder = root / "cameraCap" / day
+            for path in sorted(folder.glob("*.jpg")):
+                t = time.perf_counter()
+                analyzer.analyze(str(path), day)
+                latencies.append(time.perf_counter() - t)
+        seconds = time.perf_counter() - t0
+    return {"items": len(latencies), "seconds": seconds, "latencies": latencies}
+
+
+def bench_frames(root: Path, workdir: str) -> dict:
+    import http.server
+
+    import player
+
+    player.SCREEN_DIR = root / "screenCap"
+    player.CAMERA_DIR = root / "cameraCap"
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), player.Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/frames?date="
+
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(FRAMES_REPEAT):
+        for day in list_dates(root):
+            t = time.perf_counter()
+            with urllib.request.urlopen(url + day) as response:
+                json.load(response)
+            latencies.append(time.perf_counter() - t)
+    seconds = time.perf_counter() - t0
+    server.shutdown()
+    return {"items": len(latencies), "seconds": seconds, "latencies": latencies}
+
+
+BENCHES = {"mix": bench_mix, "vectorize": bench_vectorize, "face": bench_face, "frames": bench_frames}
+
+
+def run_child(tool: str, root: Path, result_path: str):
+    with tempfile.TemporaryDirectory() as workdir:
+        raw = BENCHES[tool](root, workdir)
+    items, seconds, latencies = raw["items"], raw["seconds"], raw["latencies"]
+    result = {
+        "items": items,
+        "seconds": round(seconds, 3),
+        "throughput": round(items / seconds, 3) if seconds > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2) if latencies else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+# ---- parent -------------------------------------------------------------------
+
+
+def run_tool(tool: str, root: Path, verbose: bool) -> dict | None:
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        cmd = [sys.executable, __file__, "--child", tool, "--data", str(root), "--result", result_path]
+        output = None if verbose else subprocess.DEVNULL
+        proc = subprocess.run(cmd, cwd=SCRIPT_DIR, stdout=output, stderr=output)
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            print(f"{tool}: failed (exit code {proc.returncode}), rerun with --verbose")
+            return None
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for tool, result in results.items():
+        base = baselines.get(tool)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{tool}: throughput {result['throughput']}/s vs baseline {base['throughput']}/s")
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{tool}: peak RSS {result['peak_rss_mb']} MiB vs baseline {base['peak_rss_mb']} MiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tools", default=",".join(TOOLS))
+    parser.add_argument("--data", default=str(BENCH_DATA_DIR), help="synthetic archive (generated if missing)")
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=60, help="timestamps per day")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the tools' own output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    root = Path(args.data)
+    if args.child:
+        run_child(args.child, root, args.result)
+        return
+
+    scale = {"days": args.days, "frames": args.frames}
+    if not (root / "screenCap").exists():
+        from make_synthetic_dataset import generate
+
+        print(f"Generating synthetic archive in {root} ({args.days} days x {args.frames} timestamps)")
+        generate(str(root), args.days, args.frames, date(2026, 1, 5), 0.1, 0.3)
+
+    results = {}
+    for tool in [t.strip() for t in args.tools.split(",") if t.strip()]:
+        if tool not in BENCHES:
+            parser.error(f"unknown tool: {tool}")
+        print(f"Running {tool}...")
+        result = run_tool(tool, root, args.verbose)
+        if result is not None:
+            results[tool] = result
+
+    print(f"\n{'tool':<10} {'items':>6} {'seconds':>8} {'items/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'RSS MiB':>8}")
+    for tool, r in results.items():
+        print(f"{tool:<10} {r['items']:>6} {r['seconds']:>8} {r['throughput']:>8} "
+              f"{r['p50_ms']!s:>8} {r['p95_ms']!s:>8} {r['peak_rss_mb']:>8}")
+
+    baselines = {}
+    if BASELINES_PATH.exists():
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines.setdefault("scale", scale)
+        if baselines["scale"] != scale:
+            baselines = {"scale": scale}
+        baselines.setdefault("tools", {}).update(results)
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"\nSaved baselines to {BASELINES_PATH}")
+        return
+
+    if not baselines:
+        print("\nNo baselines yet, run with --save-baseline to record them.")
+        return
+    if baselines["scale"] != scale:
+        print(f"\nBaselines were recorded at {baselines['scale']}, not comparing.")
+        return
+    regressions = compare(results, baselines["tools"], args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against the baselines.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Incremental activity clustering of the screen embeddings from vectorize_screenshots.py.
+
+Keeps persistent centroids in analysis/embeddings/clusters/centroids.npz and writes
+per-frame cluster labels next to each day's embeddings (<date>.labels.npy, one label
+per row of <date>.npz). Each run only looks at rows that have no label yet: they are
+assigned to the nearest centroid (cosine) and then used for a mini-batch k-means
+update, so the nightly cost scales with the new data, not with the archive.
+
+Usage:
+  python cluster_activities.py            # label new rows, refine centroids
+  python cluster_activities.py --relabel  # re-assign every day with the current centroids
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from search_screenshots import kmeans, normalize
+from vectorize_screenshots import OUTPUT_DIR
+
+CLUSTERS_DIR = OUTPUT_DIR.parent / "clusters"
+CENTROIDS_PATH = CLUSTERS_DIR / "centroids.npz"
+N_CLUSTERS = 24
+MINI_BATCH = 1024
+# Per-centroid counts are capped so old history can't freeze the centroids completely
+COUNT_CAP = 50000
+
+
+def labels_path(npz_file: Path) -> Path:
+    return npz_file.with_name(npz_file.stem + ".labels.npy")
+
+
+def load_centroids() -> tuple[np.ndarray, np.ndarray] | None:
+    if not CENTROIDS_PATH.exists():
+        return None
+    data = np.load(CENTROIDS_PATH)
+    return data["centroids"], data["counts"]
+
+
+def save_centroids(centroids: np.ndarray, counts: np.ndarray):
+    CLUSTERS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CENTROIDS_PATH.with_name("centroids.tmp.npz")
+    np.savez(tmp, centroids=centroids, counts=counts)
+    tmp.replace(CENTROIDS_PATH)
+
+
+def init_centroids(embeddings: np.ndarray, k: int = N_CLUSTERS) -> tuple[np.ndarray, np.ndarray]:
+    """Seed the centroids with a full k-means on the first data seen (at least k rows)."""
+    centroids = normalize(kmeans(embeddings, k))
+    # Start from the cluster sizes, so the first mini-batch refines the seed instead of replacing it
+    counts = np.minimum(np.bincount(assign(embeddings, centroids), minlength=len(centroids)), COUNT_CAP).astype(np.int64)
+    return centroids, counts
+
+
+def assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid by cosine similarity (embeddings and centroids normalized)."""
+    return np.argmax(embeddings @ centroids.T, axis=1).astype(np.int16)
+
+
+def minibatch_update(centroids: np.ndarray, counts: np.ndarray, batch: np.ndarray, labels: np.ndarray):
+    """One mini-batch k-means step (per-centroid learning rate 1/count), in place."""
+    onehot = np.zeros((len(batch), len(centroids)), dtype=np.float32)
+    onehot[np.arange(len(batch)), labels] = 1.0
+    batch_counts = onehot.sum(axis=0).astype(np.int64)
+    batch_sums = onehot.T @ batch
+
+    hit = batch_counts > 0
+    counts[hit] = np.minimum(counts[hit] + batch_counts[hit], COUNT_CAP)
+    eta = batch_counts[hit] / np.maximum(counts[hit], batch_counts[hit])
+    batch_means = batch_sums[hit] / batch_counts[hit, None]
+    centroids[hit] = (1.0 - eta[:, None]) * centroids[hit] + eta[:, None] * batch_means
+    centroids[hit] = normalize(centroids[hit])
+
+
+def pending_days(embeddings_dir: Path, relabel: bool) -> list[Path]:
+    """Days whose labels are missing or older than their embeddings."""
+    days = []
+    for npz_file in sorted(embeddings_dir.glob("*.npz")):
+        lp = labels_path(npz_file)
+        if relabel or not lp.exists() or lp.stat().st_mtime < npz_file.stat().st_mtime:
+            days.append(npz_file)
+    return days
+
+
+def label_day(npz_file: Path, labels: np.ndarray, new: np.ndarray, state: tuple, relabel: bool):
+    """Label the new rows of one day (refining the centroids unless relabelling) and save."""
+    centroids, counts = state
+    if relabel:
+        new_labels = assign(new, centroids)
+    else:
+        parts = []
+        for i in range(0, len(new), MINI_BATCH):
+            batch = new[i : i + MINI_BATCH]
+            batch_labels = assign(batch, centroids)
+            minibatch_update(centroids, counts, batch, batch_labels)
+            parts.append(batch_labels)
+        new_labels = np.concatenate(parts) if parts else np.empty(0, dtype=np.int16)
+
+    # Centroids first: if we stop before the labels are written, the rows are simply seen again
+    if not relabel:
+        save_centroids(centroids, counts)
+    labels = np.concatenate([labels, new_labels])
+    np.save(labels_path(npz_file), labels)
+
+    hist = np.bincount(labels, minlength=len(centroids))
+    top = np.argsort(-hist)[:5]
+    summary = ", ".join(f"#{c}: {hist[c]}" for c in top if hist[c])
+    print(f"{npz_file.stem}: {len(new_labels)} new / {len(labels)} frames labelled ({summary})")
+
+
+def main():
+    relabel = "--relabel" in sys.argv[1:]
+    embeddings_dir = OUTPUT_DIR
+    days = pending_days(embeddings_dir, relabel)
+    if not days:
+        print("All days are labelled. Nothing to do.")
+        return
+
+    state = load_centroids()
+    if state is None and relabel:
+        print("No centroids yet, run without --relabel first.")
+        return
+
+    deferred = []  # days seen before there were N_CLUSTERS rows to seed the centroids from
+    for npz_file in days:
+        data = np.load(npz_file, allow_pickle=True)
+        embeddings = normalize(data["embeddings"])
+        if len(embeddings) == 0:
+            continue
+
+        lp = labels_path(npz_file)
+        labels = np.load(lp) if lp.exists() and not relabel else np.empty(0, dtype=np.int16)
+        if len(labels) > len(embeddings):
+            # The day was re-vectorized from scratch, label it again
+            labels = np.empty(0, dtype=np.int16)
+        new = embeddings[len(labels) :]
+
+        if state is None:
+            deferred.append((npz_file, labels, new))
+            seen = sum(len(d[2]) for d in deferred)
+            if seen < N_CLUSTERS:
+                continue
+            print(f"Initializing {N_CLUSTERS} centroids from {len(deferred)} day(s), {seen} frames")
+            state = init_centroids(np.concatenate([d[2] for d in deferred]))
+            ready, deferred = deferred, []
+        else:
+            ready = [(npz_file, labels, new)]
+        for day in ready:
+            label_day(*day, state, relabel)
+
+    if deferred:
+        seen = sum(len(d[2]) for d in deferred)
+        print(f"Only {seen} frames so far, need {N_CLUSTERS} to initialize the centroids. Nothing labelled.")
+        return
+    if not relabel:
+        print(f"Saved centroids to {CENTROIDS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
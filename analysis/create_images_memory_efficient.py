@@ -2,18 +2,28 @@
 # This version processes images in small batches to avoid memory issues
 
 import os
+import json
+import shutil
 import cv2
 import numpy as np
 import random
 from datetime import datetime, timedelta
 import gc
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
+import day_archive
+import profiling
+
 # Configuration
 PHOTOS_PATH = r"D:\cameraCap"
 SCREENSHOTS_PATH = r"E:\screenCapConverted"
 OUTPUT_PATH = r"C:\Users\IWMAI\Desktop"
+CHECKPOINT_EVERY = 300  # frames between checkpoints
+PREVIEW_SCALE = 8  # partial means are compared at 1/8 resolution
+STATISTICS = ("mean", "std", "minmax", "activity")
+CHANGE_THRESHOLD = 16  # per-channel difference that counts a pixel as changed
 
 def get_date_range():
     try:
@@ -61,6 +71,21 @@ def get_date_range():
     print(f"Number of threads: {num_threads}")
     return start_date, end_date, include_camera, batch_size, num_threads
 
+def get_preview_budget():
+    """Ask for a preview budget: a frame count ("500"), a time ("60s") or nothing for a full run."""
+    try:
+        budget_str = input("Preview budget (frames, or seconds like 60s; blank for full run): ").strip().lower()
+    except EOFError:
+        budget_str = ""
+    try:
+        if budget_str.endswith("s"):
+            return None, float(budget_str[:-1])
+        if budget_str:
+            return int(budget_str), None
+    except ValueError:
+        print("Invalid budget. Doing a full run.")
+    return None, None
+
 def get_date_list(start_date, end_date):
     date_list = []
     current_date = start_date
@@ -69,30 +94,47 @@ def get_date_list(start_date, end_date):
         current_date += timedelta(days=1)
     return date_list
 
+def read_image(path: str):
+    """Same as cv2.imread, split into a disk read and a decode stage for profiling.
+    Screenshots that were moved into a day archive are read from there."""
+    if not os.path.exists(path):
+        with profiling.stage("archive_read"):
+            return day_archive.read_path(path)
+    with profiling.stage("read"):
+        try:
+            data = np.fromfile(path, dtype=np.uint8)
+        except OSError:
+            return None
+    if data.size == 0:
+        return None
+    with profiling.stage("decode"):
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+def frame_paths(date: str, timestamp: str):
+    """Paths of the camera photo, DISPLAY1 and DISPLAY2 (or DISPLAY5) screenshots of one timestamp."""
+    photo_path = os.path.join(PHOTOS_PATH, date, timestamp + ".jpg")
+    display1_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY1.png")
+    # Try DISPLAY2 first, then DISPLAY5
+    display2_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY2.png")
+    if not day_archive.exists(display2_path):
+        display2_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY5.png")
+    return photo_path, display1_path, display2_path
+
 def load_image(date: str, timestamp: str, include_camera: bool = False, target_shape=None):
     # Predefined shapes for different image types
     DISPLAY1_SHAPE = (1600, 2560)
     DISPLAY2_SHAPE = (1440, 2560)
     PHOTO_SHAPE = (2592, 1944)
     
+    photo_path, display1_path, display2_path = frame_paths(date, timestamp)
+    
     photo = None
     if include_camera:
-        photo_path = os.path.join(PHOTOS_PATH, date, timestamp + ".jpg")
-        photo = cv2.imread(photo_path) if os.path.exists(photo_path) else None
-    
-    # Check if DISPLAY1 file exists before reading
-    display1_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY1.png")
-    display1 = cv2.imread(display1_path) if os.path.exists(display1_path) else None
+        photo = read_image(photo_path) if os.path.exists(photo_path) else None
     
-    # Try DISPLAY2 first, then DISPLAY5
-    display2_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY2.png")
-    display2 = None
-    if os.path.exists(display2_path):
-        display2 = cv2.imread(display2_path)
-    else:
-        display2_path = os.path.join(SCREENSHOTS_PATH, date, timestamp + "_____DISPLAY5.png")
-        if os.path.exists(display2_path):
-            display2 = cv2.imread(display2_path)
+    # Check if the files exist before reading
+    display1 = read_image(display1_path) if day_archive.exists(display1_path) else None
+    display2 = read_image(display2_path) if day_archive.exists(display2_path) else None
     
     # Check for shape consistency and warn if different
     if display1 is not None and display1.shape[:2] != DISPLAY1_SHAPE:
@@ -111,10 +153,11 @@ def get_timestamps_for_date(date: str, include_camera: bool = False):
     photos_dir = os.path.join(PHOTOS_PATH, date)
     screenshots_dir = os.path.join(SCREENSHOTS_PATH, date)
     
-    if not os.path.exists(screenshots_dir):
+    # Includes screenshots that were moved into the day's archive
+    screenshots = day_archive.list_day(screenshots_dir)
+    if not screenshots:
         return []
     
-    screenshots = os.listdir(screenshots_dir)
     timestamps_display1 = set()
     timestamps_display2_or_5 = set()
     
@@ -148,9 +191,28 @@ def get_all_timestamps(date_list, include_camera: bool = False):
         for timestamp in timestamps:
             all_timestamps.append((date, timestamp))
     
-    random.shuffle(all_timestamps)
+    # Chronological: the activity statistic compares each frame with the previous one
     return all_timestamps
 
+def stratified_order(all_timestamps, seed=None):
+    """Order timestamps so that every prefix is a stratified sample of the whole range.
+
+    Strata are (date, hour of day). Inside a stratum of n timestamps the k-th (after
+    shuffling) gets the key (k + u) / n with u uniform in [0, 1), and all timestamps are
+    sorted by key, so each stratum contributes to any prefix in proportion to its size.
+    """
+    rng = random.Random(seed)
+    strata = {}
+    for date, timestamp in all_timestamps:
+        strata.setdefault((date, int(timestamp[:2])), []).append((date, timestamp))
+    keyed = []
+    for members in strata.values():
+        rng.shuffle(members)
+        n = len(members)
+        keyed.extend(((k + rng.random()) / n, entry) for k, entry in enumerate(members))
+    keyed.sort(key=lambda item: item[0])
+    return [entry for _, entry in keyed]
+
 def process_single_image(args):
     """Process a single timestamp - optimized for threading"""
     date, timestamp, include_camera = args
@@ -162,19 +224,15 @@ def process_single_image(args):
             display1_shape = images[1].shape
             display2_shape = images[2].shape
             
-            if include_camera and images[0] is not None:
-                camera_image = images[0]
-                photo_shape = camera_image.shape
-            else:
-                # Create a zero image with photo shape if no camera image
-                photo_shape = (2592, 1944, 3)
-                camera_image = np.zeros(photo_shape, dtype=np.uint8)
+            # None if there is no usable photo: the statistics skip it rather than count a black frame
+            camera_image = images[0] if include_camera else None
+            photo_shape = camera_image.shape if camera_image is not None else None
             
-            # Convert to float64 immediately and return
+            # Keep uint8, the batch accumulators add them into uint32 directly
             result = (
-                camera_image.astype(np.float64),
-                images[1].astype(np.float64),
-                images[2].astype(np.float64),
+                camera_image,
+                images[1],
+                images[2],
                 photo_shape,
                 display1_shape,
                 display2_shape,
@@ -190,76 +248,351 @@ def process_single_image(args):
         print(f"Error processing {date} {timestamp}: {e}")
         return None
 
-def process_batch_parallel(timestamp_batch, include_camera, num_threads):
-    """Process a batch of timestamps in parallel"""
-    # Initialize accumulators with predefined shapes
-    DISPLAY1_SHAPE = (1600, 2560, 3)
-    DISPLAY2_SHAPE = (1440, 2560, 3)
-    PHOTO_SHAPE = (2592, 1944, 3)
-    
-    batch_camera = np.zeros(PHOTO_SHAPE, dtype=np.float64)
-    batch_display1 = np.zeros(DISPLAY1_SHAPE, dtype=np.float64)
-    batch_display2 = np.zeros(DISPLAY2_SHAPE, dtype=np.float64)
-    batch_count = 0
-    
+def process_batch_parallel(timestamp_batch, include_camera, num_threads, stats):
+    """Decode a batch of timestamps in parallel and add them to stats in chronological order"""
     # Prepare arguments for parallel processing
     args_list = [(date, timestamp, include_camera) for date, timestamp in timestamp_batch]
+    batch_count = 0
     
-    # Use ThreadPoolExecutor for parallel processing
+    # executor.map yields in submission order while later frames are still decoding,
+    # so the order-dependent statistics (activity) see the frames in time order
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(process_single_image, args) for args in args_list]
-        
-        for future in as_completed(futures):
-            result = future.result()
-            if result is not None:
-                camera_img, display1_img, display2_img, photo_shape, display1_shape, display2_shape, count = result
-                
-                # Only accumulate if shapes match expected
-                if photo_shape == PHOTO_SHAPE:
-                    batch_camera += camera_img
-                if display1_shape == DISPLAY1_SHAPE:
-                    batch_display1 += display1_img
-                if display2_shape == DISPLAY2_SHAPE:
-                    batch_display2 += display2_img
-                
-                batch_count += count
-                
-                # Clean up immediately
-                del camera_img, display1_img, display2_img
+        for (date, timestamp), result in zip(timestamp_batch, executor.map(process_single_image, args_list)):
+            if result is None:
+                continue
+            camera_img, display1_img, display2_img, photo_shape, display1_shape, display2_shape, count = result
+            
+            with profiling.stage("accumulate"):
+                stats.add(date, {"camera": camera_img, "display1": display1_img, "display2": display2_img})
+            
+            batch_count += count
+            profiling.count("frames", count)
+            
+            # Clean up immediately
+            del camera_img, display1_img, display2_img
     
-    return batch_camera, batch_display1, batch_display2, batch_count
+    return batch_count
+
+def normalize_image(img: np.ndarray) -> np.ndarray:
+    """Stretch an accumulated image to 0..255 and convert it to uint8."""
+    img = img.astype(np.float64)
+    if img.max() > 0:
+        img -= img.min()
+        img /= max(img.max(), 1e-12)
+        img *= 255
+    return img.astype(np.uint8)
+
+class PixelStatistics:
+    """Per-pixel statistics of one image stream, updated one frame at a time.
+
+    Each statistic has its own compact accumulator:
+      mean      uint32 sum (exact for up to 16 million frames)
+      std       Welford running mean and sum of squared deviations, float32
+      minmax    uint8 minimum and maximum
+      activity  uint32 (H, W) count of frames in which a pixel changed by more than
+                CHANGE_THRESHOLD in any channel since the previous frame of the same day
+    All state lives in self.arrays so a Checkpoint can persist it.
+    """
+
+    def __init__(self, shape: tuple, statistics: tuple):
+        self.shape = shape
+        self.statistics = statistics
+        self.arrays = {"count": np.zeros(1, dtype=np.int64)}
+        if "mean" in statistics:
+            self.arrays["sum"] = np.zeros(shape, dtype=np.uint32)
+        if "std" in statistics:
+            self.arrays["welford_mean"] = np.zeros(shape, dtype=np.float32)
+            self.arrays["welford_m2"] = np.zeros(shape, dtype=np.float32)
+        if "minmax" in statistics:
+            self.arrays["min"] = np.full(shape, 255, dtype=np.uint8)
+            self.arrays["max"] = np.zeros(shape, dtype=np.uint8)
+        if "activity" in statistics:
+            self.arrays["changes"] = np.zeros(shape[:2], dtype=np.uint32)
+            self.arrays["previous"] = np.zeros(shape, dtype=np.uint8)
+            self.arrays["has_previous"] = np.zeros(1, dtype=np.uint8)
+
+    @property
+    def count(self) -> int:
+        return int(self.arrays["count"][0])
+
+    def reset_previous(self):
+        """Start a new day: the next frame is not compared with the last one."""
+        if "has_previous" in self.arrays:
+            self.arrays["has_previous"][0] = 0
+
+    def add(self, img: np.ndarray | None):
+        """Add one frame; None (missing or unreadable image) and wrong shapes are skipped."""
+        if img is None or img.shape != self.shape:
+            return
+        a = self.arrays
+        a["count"] += 1
+        if "sum" in a:
+            a["sum"] += img
+        if "welford_mean" in a:
+            delta = img.astype(np.float32) - a["welford_mean"]
+            a["welford_mean"] += delta / self.count
+            delta *= img - a["welford_mean"]
+            a["welford_m2"] += delta
+        if "min" in a:
+            np.minimum(a["min"], img, out=a["min"])
+            np.maximum(a["max"], img, out=a["max"])
+        if "changes" in a:
+            if a["has_previous"][0]:
+                changed = cv2.absdiff(img, a["previous"]).max(axis=2) > CHANGE_THRESHOLD
+                a["changes"] += changed
+            a["previous"][:] = img
+            a["has_previous"][0] = 1
+
+    def images(self) -> dict:
+        """uint8 image of every statistic, keyed by output name ("mean", "std", ...)."""
+        a = self.arrays
+        out = {}
+        if "sum" in a:
+            out["mean"] = normalize_image(a["sum"])
+        if "welford_m2" in a:
+            out["std"] = normalize_image(np.sqrt(a["welford_m2"] / max(self.count, 1)))
+        if "min" in a:
+            out["min"] = a["min"].copy()
+            out["max"] = a["max"].copy()
+        if "changes" in a:
+            out["activity"] = cv2.applyColorMap(normalize_image(a["changes"]), cv2.COLORMAP_INFERNO)
+        return out
+
+class CompositeStatistics:
+    """PixelStatistics for the camera (optional), DISPLAY1 and DISPLAY2 streams of a range."""
+
+    def __init__(self, include_camera: bool, statistics: tuple):
+        shapes = {"camera": (2592, 1944, 3), "display1": (1600, 2560, 3), "display2": (1440, 2560, 3)}
+        if not include_camera:
+            del shapes["camera"]
+        self.statistics = statistics
+        self.streams = {kind: PixelStatistics(shape, statistics) for kind, shape in shapes.items()}
+        self.date = None
+
+    def arrays(self) -> dict:
+        """Every accumulator, flattened as "<stream>.<array>" for the Checkpoint."""
+        return {f"{kind}.{name}": arr for kind, stream in self.streams.items() for name, arr in stream.arrays.items()}
+
+    def add(self, date: str, images: dict):
+        if date != self.date:
+            for stream in self.streams.values():
+                stream.reset_previous()
+            self.date = date
+        for kind, stream in self.streams.items():
+            stream.add(images[kind])
+
+class Checkpoint:
+    """Accumulators of a mix_images run, persisted in memory-mapped .npy files.
+
+    There are two slots of accumulator files. save() writes the running accumulators into
+    the slot that is not current, flushes it, appends the newly processed (date, timestamp)
+    entries to processed.txt and then atomically replaces state.json, which names the
+    current slot, the frame count and how many processed.txt lines are valid. A crash at
+    any point leaves the previous checkpoint usable.
+    """
+
+    def __init__(self, path: str, arrays: dict, include_camera: bool, statistics: tuple):
+        self.path = path
+        self.arrays = arrays
+        self.include_camera = include_camera
+        self.statistics = list(statistics)
+        self.state_path = os.path.join(path, "state.json")
+        self.processed_path = os.path.join(path, "processed.txt")
 
-def save_images(date: str, photo: np.ndarray, display1: np.ndarray, display2: np.ndarray):
-    cv2.imwrite(os.path.join(OUTPUT_PATH, date + ".jpg"), photo)
-    cv2.imwrite(os.path.join(OUTPUT_PATH, date + "_____DISPLAY1.png"), display1)
-    cv2.imwrite(os.path.join(OUTPUT_PATH, date + "_____DISPLAY5.png"), display2)
+    def load(self):
+        """Fill the accumulators in place and return (valid_count, processed set, last date).
+
+        Without a checkpoint the accumulators are left untouched.
+        """
+        if not os.path.exists(self.state_path):
+            self.state = {"slot": None, "count": 0, "processed": 0, "date": None,
+                          "include_camera": self.include_camera, "statistics": self.statistics}
+            return 0, set(), None
+        with open(self.state_path) as f:
+            self.state = json.load(f)
+        for key in ("include_camera", "statistics"):
+            if self.state.get(key) != getattr(self, key):
+                raise ValueError(f"Checkpoint in {self.path} was made with {key}={self.state.get(key)}, "
+                                 "delete it to start over")
+        for name, arr in self.arrays.items():
+            arr[...] = np.load(self._slot_file(self.state["slot"], name), mmap_mode="r")
+        with open(self.processed_path) as f:
+            lines = f.read().splitlines()[: self.state["processed"]]
+        processed = {tuple(line.split(" ", 1)) for line in lines}
+        # Drop entries appended after the last state.json (interrupted checkpoint)
+        with open(self.processed_path, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+        return self.state["count"], processed, self.state["date"]
+
+    def _slot_file(self, slot: str, name: str) -> str:
+        return os.path.join(self.path, f"slot_{slot}", name + ".npy")
+
+    def save(self, valid_count: int, new_entries: list, date: str):
+        slot = "b" if self.state["slot"] == "a" else "a"
+        os.makedirs(os.path.join(self.path, f"slot_{slot}"), exist_ok=True)
+        for name, arr in self.arrays.items():
+            file = self._slot_file(slot, name)
+            mode = "r+" if os.path.exists(file) else "w+"
+            mm = np.lib.format.open_memmap(file, mode=mode, dtype=arr.dtype, shape=arr.shape)
+            mm[:] = arr
+            mm.flush()
+            del mm
+        with open(self.processed_path, "a") as f:
+            f.writelines(f"{date} {timestamp}\n" for date, timestamp in new_entries)
+            f.flush()
+            os.fsync(f.fileno())
+        state = dict(self.state, slot=slot, count=valid_count, date=date,
+                     processed=self.state["processed"] + len(new_entries))
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+        self.state = state
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+def save_images(date: str, photo: np.ndarray, display1: np.ndarray, display2: np.ndarray, statistics: dict = None):
+    """Save the mean composite and, optionally, other statistics.
+
+    statistics maps a statistic name ("std", "min", "max", "activity") to its
+    (photo, display1, display2) images; photo may be None. They are saved with the
+    statistic name after the date, e.g. <date>_std_____DISPLAY1.png.
+    """
+    if photo is not None:
+        cv2.imwrite(os.path.join(OUTPUT_PATH, date + ".jpg"), photo)
+    if display1 is not None:
+        cv2.imwrite(os.path.join(OUTPUT_PATH, date + "_____DISPLAY1.png"), display1)
+    if display2 is not None:
+        cv2.imwrite(os.path.join(OUTPUT_PATH, date + "_____DISPLAY5.png"), display2)
+    for name, (stat_photo, stat_display1, stat_display2) in (statistics or {}).items():
+        save_images(f"{date}_{name}", stat_photo, stat_display1, stat_display2)
+
+def save_statistics(date: str, stats: CompositeStatistics):
+    images = {kind: stream.images() for kind, stream in stats.streams.items()}
+    by_statistic = {}
+    for name in images["display1"]:
+        camera = images["camera"][name] if "camera" in images else None
+        by_statistic[name] = (camera, images["display1"][name], images["display2"][name])
+    mean = by_statistic.pop("mean", None)
+    if mean is not None:
+        camera, display1, display2 = mean
+        # Without camera photos the mean photo is black, as it always was
+        if camera is None:
+            camera = np.zeros((2592, 1944, 3), dtype=np.uint8)
+        save_images(date, camera, display1, display2, by_statistic)
+    else:
+        save_images(date, None, None, None, by_statistic)
+
+def get_statistics():
+    """Ask which statistics to compute, default only the mean."""
+    try:
+        statistics_str = input(f"Statistics ({','.join(STATISTICS)}; default: mean): ").strip().lower()
+    except EOFError:
+        statistics_str = ""
+    statistics = tuple(name for name in STATISTICS if name in statistics_str.replace(" ", "").split(","))
+    if not statistics:
+        statistics = ("mean",)
+    print(f"Statistics: {', '.join(statistics)}")
+    return statistics
 
 def mix_images():
     start_date, end_date, include_camera, batch_size, num_threads = get_date_range()
+    max_frames, max_seconds = get_preview_budget()
+    if max_frames or max_seconds:
+        run_preview(start_date, end_date, include_camera, batch_size, num_threads, max_frames, max_seconds)
+    else:
+        statistics = get_statistics()
+        run_mix(start_date, end_date, include_camera, batch_size, num_threads, statistics)
+
+def downscaled_mean(stats: CompositeStatistics) -> np.ndarray:
+    """Small copy of the current per-pixel mean of every stream, flattened."""
+    parts = []
+    for stream in stats.streams.values():
+        h, w = stream.shape[:2]
+        small = cv2.resize(stream.arrays["sum"].astype(np.float32), (w // PREVIEW_SCALE, h // PREVIEW_SCALE),
+                           interpolation=cv2.INTER_AREA)
+        parts.append(small.ravel() / max(stream.count, 1))
+    return np.concatenate(parts)
+
+def run_preview(start_date, end_date, include_camera, batch_size, num_threads, max_frames=None, max_seconds=None):
+    """Build a composite from a stratified sample of the range, within a frame and/or time budget.
+
+    After every batch the partial mean is compared with the previous one (mean absolute
+    difference in 0..255 levels, on 1/PREVIEW_SCALE copies) as a convergence estimate.
+    Output is saved as <start>_to_<end>_preview. Returns the number of timestamps used.
+    """
+    date_list = get_date_list(start_date, end_date)
+    all_timestamps = stratified_order(get_all_timestamps(date_list, include_camera))
+    if not all_timestamps:
+        print("No images found in the specified date range.")
+        return 0
+    if max_frames:
+        all_timestamps = all_timestamps[:max_frames]
+    budget = f"{len(all_timestamps)} frames" + (f", {max_seconds:g} s" if max_seconds else "")
+    print(f"Preview: sampling up to {budget} in batches of {batch_size} using {num_threads} threads...")
+    
+    stats = CompositeStatistics(include_camera, ("mean",))
+    valid_count = 0
+    previous = None
+    change = None
+    start_time = time.perf_counter()
+    
+    for i in range(0, len(all_timestamps), batch_size):
+        if max_seconds and time.perf_counter() - start_time >= max_seconds:
+            print("  Time budget reached.")
+            break
+        batch = all_timestamps[i:i + batch_size]
+        valid_count += process_batch_parallel(batch, include_camera, num_threads, stats)
+        if valid_count == 0:
+            continue
+        
+        current = downscaled_mean(stats)
+        if previous is not None:
+            change = float(np.abs(current - previous).mean())
+            print(f"  {valid_count} frames, {time.perf_counter() - start_time:.1f} s, mean change {change:.3f} levels")
+        else:
+            print(f"  {valid_count} frames, {time.perf_counter() - start_time:.1f} s")
+        previous = current
+    
+    if valid_count == 0:
+        print("No valid images found.")
+        return 0
+    
+    output_date = f"{start_date}_to_{end_date}_preview"
+    save_statistics(output_date, stats)
+    if change is not None:
+        print(f"Last batch changed the mean by {change:.3f} levels (of 255); smaller means closer to the full run.")
+    print(f"Preview created using {valid_count} timestamps in {time.perf_counter() - start_time:.1f} s")
+    print(f"Output saved with prefix: {output_date}")
+    return valid_count
+
+def run_mix(start_date, end_date, include_camera, batch_size, num_threads, statistics=("mean",)):
+    """Build the composite (and other statistics) for a date range in one decode pass.
+
+    Returns the number of timestamps used.
+    """
     date_list = get_date_list(start_date, end_date)
     all_timestamps = get_all_timestamps(date_list, include_camera)
     
     if not all_timestamps:
         print("No images found in the specified date range.")
-        return
+        return 0
     
     print(f"Processing {len(all_timestamps)} timestamps in batches of {batch_size} using {num_threads} threads...")
+    print(f"Statistics: {', '.join(statistics)}")
     
-    # Initialize accumulators with predefined shapes
-    DISPLAY1_SHAPE = (1600, 2560, 3)
-    DISPLAY2_SHAPE = (1440, 2560, 3)
-    PHOTO_SHAPE = (2592, 1944, 3)
-    
-    print(f"Using predefined shapes:")
-    print(f"  DISPLAY1: {DISPLAY1_SHAPE}")
-    print(f"  DISPLAY2: {DISPLAY2_SHAPE}")
-    print(f"  Camera: {PHOTO_SHAPE}")
-    
-    # Initialize accumulators
-    camera_img = np.zeros(PHOTO_SHAPE, dtype=np.float64)
-    display1_img = np.zeros(DISPLAY1_SHAPE, dtype=np.float64)
-    display2_img = np.zeros(DISPLAY2_SHAPE, dtype=np.float64)
-    valid_count = 0
+    # Initialize accumulators, resuming from a previous interrupted run of the same range
+    output_date = f"{start_date}_to_{end_date}"
+    stats = CompositeStatistics(include_camera, statistics)
+    checkpoint = Checkpoint(
+        os.path.join(OUTPUT_PATH, f"{output_date}_checkpoint"), stats.arrays(), include_camera, statistics
+    )
+    valid_count, processed, stats.date = checkpoint.load()
+    if processed:
+        all_timestamps = [entry for entry in all_timestamps if entry not in processed]
+        print(f"Resuming from checkpoint: {len(processed)} timestamps done, {valid_count} used, {len(all_timestamps)} left")
+    new_entries = []
     
     # Process in batches
     for i in range(0, len(all_timestamps), batch_size):
@@ -269,53 +602,32 @@ def mix_images():
         
         print(f"Processing batch {batch_num}/{total_batches} ({len(batch)} images)...")
         
-        batch_camera, batch_display1, batch_display2, batch_count = process_batch_parallel(
-            batch, include_camera, num_threads
-        )
-        
-        # Accumulate results
-        camera_img += batch_camera
-        display1_img += batch_display1
-        display2_img += batch_display2
+        batch_count = process_batch_parallel(batch, include_camera, num_threads, stats)
         valid_count += batch_count
+        new_entries.extend(batch)
+        
+        if len(new_entries) >= CHECKPOINT_EVERY:
+            with profiling.stage("checkpoint"):
+                checkpoint.save(valid_count, new_entries, stats.date)
+            new_entries = []
         
         print(f"  Batch complete. Processed {batch_count}/{len(batch)} images successfully.")
         print(f"  Total processed: {valid_count}")
-        
-        # Force garbage collection
-        del batch_camera, batch_display1, batch_display2
         gc.collect()
     
+    if new_entries:
+        checkpoint.save(valid_count, new_entries, stats.date)
+    
     if valid_count == 0:
         print("No valid images found.")
-        return
+        return 0
     
     print("Normalizing images...")
-    
-    # Normalize images
-    if camera_img.max() > 0:
-        camera_img -= camera_img.min()
-        camera_img /= camera_img.max()
-        camera_img *= 255
-    
-    display1_img -= display1_img.min()
-    display1_img /= display1_img.max()
-    display1_img *= 255
-    
-    display2_img -= display2_img.min()
-    display2_img /= display2_img.max()
-    display2_img *= 255
-    
-    # Convert to uint8
-    camera_img = camera_img.astype(np.uint8)
-    display1_img = display1_img.astype(np.uint8)
-    display2_img = display2_img.astype(np.uint8)
-    
-    # Save images
-    output_date = f"{start_date}_to_{end_date}"
-    save_images(output_date, camera_img, display1_img, display2_img)
+    save_statistics(output_date, stats)
+    checkpoint.remove()
     print(f"Images created successfully using {valid_count} timestamps")
     print(f"Output saved with prefix: {output_date}")
+    return valid_count
 
 if __name__ == '__main__':
     mix_images()
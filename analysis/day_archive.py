@@ -0,0 +1,266 @@
+"""
+Compact random-access archive for one day of screenshots.
+
+Successive screenshots are nearly identical, so each frame is cut into TILE x TILE
+tiles and every distinct tile (by content hash) is stored once, PNG-compressed.
+A day directory screenCap/<date>/ becomes screenCap/<date>.wpa/ with:
+
+  tiles.bin   the unique PNG-encoded tiles, back to back
+  index.npz   tile offsets/lengths/hashes and, per frame, its file name, shape and
+              tile grid
+
+Frames are read back by file name (or timestamp + display) without touching the other
+frames; decoded tiles are kept in a small LRU cache, so playing a day in order only
+decodes the tiles that changed. The reader helpers (exists, read_path, list_day) fall
+back transparently from the original files to the archive, so the tools keep using
+the same screenCap/<date>/<name>.png paths.
+
+Usage:
+  python day_archive.py <screenCap dir> <date> [<date> ...] [--delete]
+
+--delete removes the original PNGs after every frame was verified to decode identically.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ARCHIVE_SUFFIX = ".wpa"
+TILE = 256
+TILE_CACHE = 256  # decoded tiles kept per archive (256 x 192 KiB = 48 MiB)
+
+
+def archive_dir(day_dir) -> Path:
+    day_dir = Path(day_dir)
+    return day_dir.parent / (day_dir.name + ARCHIVE_SUFFIX)
+
+
+class DayArchive:
+    """Reader for one <date>.wpa directory. Safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index_mtime = (self.path / "index.npz").stat().st_mtime
+        index = np.load(self.path / "index.npz")
+        self.tile_offsets = index["tile_offsets"]
+        self.tile_lengths = index["tile_lengths"]
+        self.tile_hashes = index["tile_hashes"]
+        self.frame_names = index["frame_names"].tolist()
+        self.frame_shapes = index["frame_shapes"]
+        self.frame_tiles = index["frame_tiles"]
+        self.frame_index = {name: i for i, name in enumerate(self.frame_names)}
+        size = int(self.tile_offsets[-1] + self.tile_lengths[-1]) if len(self.tile_offsets) else 0
+        self.blob = np.memmap(self.path / "tiles.bin", dtype=np.uint8, mode="r", shape=(size,)) if size else None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.frame_index
+
+    def __len__(self) -> int:
+        return len(self.frame_names)
+
+    def names(self) -> list[str]:
+        return list(self.frame_names)
+
+    def timestamps(self) -> list[str]:
+        return sorted({name.split("_____")[0] for name in self.frame_names})
+
+    def _tile(self, tile_id: int) -> np.ndarray:
+        with self._lock:
+            tile = self._cache.get(tile_id)
+            if tile is not None:
+                self._cache.move_to_end(tile_id)
+                return tile
+        start = int(self.tile_offsets[tile_id])
+        data = np.asarray(self.blob[start : start + int(self.tile_lengths[tile_id])])
+        tile = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        with self._lock:
+            self._cache[tile_id] = tile
+            if len(self._cache) > TILE_CACHE:
+                self._cache.popitem(last=False)
+        return tile
+
+    def read(self, name: str) -> np.ndarray | None:
+        """Decode one frame (BGR, like cv2.imread), None if it is not in the archive."""
+        i = self.frame_index.get(name)
+        if i is None:
+            return None
+        h, w, c = self.frame_shapes[i]
+        img = np.empty((h, w, c), dtype=np.uint8)
+        cols = -(-w // TILE)
+        for k, tile_id in enumerate(self.frame_tiles[i]):
+            if tile_id < 0:
+                break
+            y, x = (k // cols) * TILE, (k % cols) * TILE
+            tile = self._tile(int(tile_id))
+            img[y : y + tile.shape[0], x : x + tile.shape[1]] = tile
+        return img
+
+    def read_timestamp(self, timestamp: str, display: str) -> np.ndarray | None:
+        """Frame by timestamp and display name, e.g. ("09-30-00", "DISPLAY1")."""
+        return self.read(f"{timestamp}_____{display}.png")
+
+
+def tile_hash(tile: np.ndarray) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array(tile.shape, dtype=np.int32).tobytes())
+    h.update(tile.tobytes())
+    return h.digest()
+
+
+def build_archive(day_dir, delete: bool = False) -> Path:
+    """Add every PNG of day_dir that is not archived yet to <day_dir>.wpa (append-only)."""
+    day_dir = Path(day_dir)
+    out = archive_dir(day_dir)
+    out.mkdir(exist_ok=True)
+
+    if (out / "index.npz").exists():
+        old = DayArchive(out)
+        tile_offsets = old.tile_offsets.tolist()
+        tile_lengths = old.tile_lengths.tolist()
+        tile_hashes = [row.tobytes() for row in old.tile_hashes]
+        frame_names = old.frame_names
+        frame_shapes = old.frame_shapes.tolist()
+        frame_tiles = [row[row >= 0].tolist() for row in old.frame_tiles]
+        del old
+    else:
+        tile_offsets, tile_lengths, tile_hashes = [], [], []
+        frame_names, frame_shapes, frame_tiles = [], [], []
+    known = {h: i for i, h in enumerate(tile_hashes)}
+    archived = set(frame_names)
+    end = tile_offsets[-1] + tile_lengths[-1] if tile_offsets else 0
+
+    pngs = sorted(p for p in day_dir.glob("*.png") if p.name not in archived)
+    _archives.pop(str(out), None)
+    with open(out / "tiles.bin", "ab") as blob:
+        # Drop tiles written after the last index update (interrupted run)
+        if blob.tell() > end:
+            blob.truncate(end)
+        for path in pngs:
+            img = cv2.imread(str(path))
+            if img is None:
+                print(f"  Skip {path.name}: cannot decode")
+                continue
+            h, w = img.shape[:2]
+            ids = []
+            for y in range(0, h, TILE):
+                for x in range(0, w, TILE):
+                    tile = np.ascontiguousarray(img[y : y + TILE, x : x + TILE])
+                    digest = tile_hash(tile)
+                    tile_id = known.get(digest)
+                    if tile_id is None:
+                        data = cv2.imencode(".png", tile)[1].tobytes()
+                        blob.write(data)
+                        tile_id = len(tile_offsets)
+                        tile_offsets.append(end)
+                        tile_lengths.append(len(data))
+                        tile_hashes.append(digest)
+                        known[digest] = tile_id
+                        end += len(data)
+                    ids.append(tile_id)
+            frame_names.append(path.name)
+            frame_shapes.append(img.shape)
+            frame_tiles.append(ids)
+
+    width = max((len(ids) for ids in frame_tiles), default=0)
+    grid = np.full((len(frame_tiles), width), -1, dtype=np.int32)
+    for i, ids in enumerate(frame_tiles):
+        grid[i, : len(ids)] = ids
+    tmp = out / "index.tmp.npz"
+    np.savez(
+        tmp,
+        tile_offsets=np.array(tile_offsets, dtype=np.int64),
+        tile_lengths=np.array(tile_lengths, dtype=np.int64),
+        tile_hashes=np.frombuffer(b"".join(tile_hashes), dtype=np.uint8).reshape(-1, 16),
+        frame_names=np.array(frame_names),
+        frame_shapes=np.array(frame_shapes, dtype=np.int32).reshape(-1, 3),
+        frame_tiles=grid,
+    )
+    os.replace(tmp, out / "index.npz")
+    _archives.pop(str(out), None)
+
+    if delete:
+        archive = DayArchive(out)
+        for path in pngs:
+            original = cv2.imread(str(path))
+            if original is not None and np.array_equal(archive.read(path.name), original):
+                path.unlink()
+            else:
+                print(f"  Keeping {path.name}: archived copy does not match")
+    return out
+
+
+# ---- reader helpers used by the tools ---------------------------------------
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(day_dir) -> DayArchive | None:
+    """Cached DayArchive for a day directory, None if the day is not archived."""
+    path = archive_dir(day_dir)
+    index = path / "index.npz"
+    if not index.exists():
+        return None
+    key = str(path)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is None or archive.index_mtime != index.stat().st_mtime:
+            archive = DayArchive(path)
+            _archives[key] = archive
+        return archive
+
+
+def exists(path) -> bool:
+    """True if the screenshot exists on disk or in its day's archive."""
+    if os.path.exists(path):
+        return True
+    path = Path(path)
+    archive = open_archive(path.parent)
+    return archive is not None and path.name in archive
+
+
+def read_path(path) -> np.ndarray | None:
+    """Decode a screenshot from its day's archive by its original path."""
+    path = Path(path)
+    archive = open_archive(path.parent)
+    return archive.read(path.name) if archive is not None else None
+
+
+def list_day(day_dir) -> list[str]:
+    """File names of a day, from the directory and the archive."""
+    names = set()
+    if os.path.isdir(day_dir):
+        names.update(os.listdir(day_dir))
+    archive = open_archive(day_dir)
+    if archive is not None:
+        names.update(archive.names())
+    return sorted(names)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    delete = "--delete" in sys.argv[1:]
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    root = Path(args[0])
+    for date in args[1:]:
+        day_dir = root / date
+        before = sum(p.stat().st_size for p in day_dir.glob("*.png"))
+        out = build_archive(day_dir, delete)
+        archive = DayArchive(out)
+        after = sum(p.stat().st_size for p in out.iterdir())
+        print(f"{date}: {len(archive)} frames, {len(archive.tile_offsets)} unique tiles, "
+              f"{before / 2**20:.1f} MiB of PNGs -> archive {after / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
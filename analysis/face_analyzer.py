@@ -17,6 +17,9 @@ from mediapipe.tasks.python.vision import (
     RunningMode,
 )
 
+import face_rollup
+import profiling
+
 PHOTOS_PATH = r"D:\cameraCap"
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "face_landmarker.task")
 MODEL_URL = "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/latest/face_landmarker.task"
@@ -188,7 +191,12 @@ class FaceAnalyzer:
     def analyze(self, image_path: str, date: str) -> FaceAnalysis:
         """Analyze a single image and return FaceAnalysis."""
         timestamp = os.path.splitext(os.path.basename(image_path))[0]
-        img = cv2.imread(image_path)
+        with profiling.stage("imread"):
+            img = cv2.imread(image_path)
+        return self.analyze_image(img, timestamp, date)
+
+    def analyze_image(self, img: np.ndarray | None, timestamp: str, date: str) -> FaceAnalysis:
+        """Analyze an already decoded BGR image (None if it could not be read)."""
         if img is None:
             return FaceAnalysis(
                 timestamp=timestamp,
@@ -198,7 +206,9 @@ class FaceAnalyzer:
 
         rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
-        result = self._landmarker.detect(mp_image)
+        with profiling.stage("face_detect"):
+            result = self._landmarker.detect(mp_image)
+        profiling.count("faces_analyzed")
 
         if not result.face_landmarks:
             return FaceAnalysis(
@@ -226,6 +236,15 @@ class FaceAnalyzer:
         )
 
 
+def save_analysis(folder: str, results: list[dict]):
+    """Write the per-frame results of one day to <folder>/analysis.json."""
+    out_path = os.path.join(folder, "analysis.json")
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {out_path}")
+    face_rollup.update_day(os.path.basename(os.path.normpath(folder)), os.path.dirname(os.path.normpath(folder)))
+
+
 def main():
     date = sys.argv[1] if len(sys.argv) > 1 else datetime.now().strftime("%Y-%m-%d")
     folder = os.path.join(PHOTOS_PATH, date)
@@ -250,27 +269,9 @@ def main():
             if i % 50 == 0 or i == len(images):
                 print(f"  {i}/{len(images)}")
 
-    # Write output
-    out_path = os.path.join(folder, "analysis.json")
-    with open(out_path, "w") as f:
-        json.dump(results, f, indent=2)
-    print(f"Saved {out_path}")
+    save_analysis(folder, results)
 
-    # Print summary
-    detected = sum(1 for r in results if r["presence"]["detected"])
-    focused = sum(1 for r in results if r["focus"] and r["focus"]["is_focused"])
-    expressions = {}
-    for r in results:
-        if r["expression"]:
-            expr = r["expression"]["dominant"]
-            expressions[expr] = expressions.get(expr, 0) + 1
-
-    print(f"\nSummary for {date}:")
-    print(f"  Images analyzed: {len(results)}")
-    print(f"  Face detected:   {detected}/{len(results)}")
-    print(f"  Focused:         {focused}/{detected}" if detected else "  Focused:         N/A")
-    if expressions:
-        print(f"  Expressions:     {expressions}")
+    face_rollup.print_summary(date, face_rollup.summarize(results))
 
 
 if __name__ == "__main__":
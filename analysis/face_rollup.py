@@ -0,0 +1,172 @@
+"""
+Per-day rollups of the face analysis results, for fast range queries.
+
+Each day's analysis.json (one record per camera photo) is reduced to a single row of
+<PHOTOS_PATH>/face_rollup.sqlite: frame, detected and focused counts, the dominant
+expression histogram and the same counts per hour of day. A row remembers the mtime
+of the analysis.json it was built from and is rebuilt when that changes, so a range
+query only reads the files that changed and then merges one row per day.
+
+face_analyzer.save_analysis updates the day it writes; refresh() catches up on
+anything else (e.g. files copied from another machine).
+
+Usage:
+  python face_rollup.py <start yyyy-mm-dd> [<end yyyy-mm-dd>] [--hourly]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+PHOTOS_PATH = r"D:\cameraCap"
+DB_NAME = "face_rollup.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    date        TEXT PRIMARY KEY,
+    mtime       REAL NOT NULL,
+    frames      INTEGER NOT NULL,
+    detected    INTEGER NOT NULL,
+    focused     INTEGER NOT NULL,
+    expressions TEXT NOT NULL,  -- JSON {label: count}
+    hourly      TEXT NOT NULL   -- JSON [[frames, detected, focused] x 24]
+)
+"""
+
+
+def summarize(results: list[dict]) -> dict:
+    """Counts of one day's analysis records (the list saved in analysis.json)."""
+    detected = focused = 0
+    expressions = {}
+    hourly = [[0, 0, 0] for _ in range(24)]
+    for r in results:
+        bucket = hourly[int(r["timestamp"][:2]) % 24]
+        bucket[0] += 1
+        if r["presence"]["detected"]:
+            detected += 1
+            bucket[1] += 1
+        if r["focus"] and r["focus"]["is_focused"]:
+            focused += 1
+            bucket[2] += 1
+        if r["expression"]:
+            expr = r["expression"]["dominant"]
+            expressions[expr] = expressions.get(expr, 0) + 1
+    return {"frames": len(results), "detected": detected, "focused": focused,
+            "expressions": expressions, "hourly": hourly}
+
+
+def connect(photos_path: str = None) -> sqlite3.Connection:
+    db = sqlite3.connect(os.path.join(photos_path or PHOTOS_PATH, DB_NAME))
+    db.execute(SCHEMA)
+    return db
+
+
+def update_day(day: str, photos_path: str = None, db: sqlite3.Connection = None) -> bool:
+    """Rebuild the row of a day if its analysis.json changed. Returns True if it did."""
+    photos_path = photos_path or PHOTOS_PATH
+    path = os.path.join(photos_path, day, "analysis.json")
+    own = db is None
+    db = db or connect(photos_path)
+    try:
+        if not os.path.exists(path):
+            db.execute("DELETE FROM days WHERE date = ?", (day,))
+            db.commit()
+            return False
+        mtime = os.stat(path).st_mtime
+        row = db.execute("SELECT mtime FROM days WHERE date = ?", (day,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return False
+        with open(path) as f:
+            s = summarize(json.load(f))
+        db.execute(
+            "INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (day, mtime, s["frames"], s["detected"], s["focused"],
+             json.dumps(s["expressions"]), json.dumps(s["hourly"])),
+        )
+        db.commit()
+        return True
+    finally:
+        if own:
+            db.close()
+
+
+def refresh(start: date, end: date, photos_path: str = None, db: sqlite3.Connection = None) -> int:
+    """Bring the rows of a date range up to date. Returns the number of days rebuilt."""
+    photos_path = photos_path or PHOTOS_PATH
+    own = db is None
+    db = db or connect(photos_path)
+    try:
+        rebuilt = 0
+        day = start
+        while day <= end:
+            rebuilt += update_day(day.isoformat(), photos_path, db)
+            day += timedelta(days=1)
+        return rebuilt
+    finally:
+        if own:
+            db.close()
+
+
+def query(start: date, end: date, photos_path: str = None) -> dict:
+    """Merged counts of a date range, refreshing changed days first.
+
+    Returns the same keys as summarize() plus "days" (the dates that have results).
+    """
+    db = connect(photos_path)
+    try:
+        refresh(start, end, photos_path, db)
+        rows = db.execute(
+            "SELECT date, frames, detected, focused, expressions, hourly FROM days "
+            "WHERE date BETWEEN ? AND ? ORDER BY date",
+            (start.isoformat(), end.isoformat()),
+        ).fetchall()
+    finally:
+        db.close()
+
+    total = {"days": [], "frames": 0, "detected": 0, "focused": 0, "expressions": {},
+             "hourly": [[0, 0, 0] for _ in range(24)]}
+    for day, frames, detected, focused, expressions, hourly in rows:
+        total["days"].append(day)
+        total["frames"] += frames
+        total["detected"] += detected
+        total["focused"] += focused
+        for expr, n in json.loads(expressions).items():
+            total["expressions"][expr] = total["expressions"].get(expr, 0) + n
+        for bucket, counts in zip(total["hourly"], json.loads(hourly)):
+            for i, n in enumerate(counts):
+                bucket[i] += n
+    return total
+
+
+def print_summary(title: str, s: dict, hourly: bool = False):
+    print(f"\nSummary for {title}:")
+    print(f"  Images analyzed: {s['frames']}")
+    print(f"  Face detected:   {s['detected']}/{s['frames']}")
+    print(f"  Focused:         {s['focused']}/{s['detected']}" if s["detected"] else "  Focused:         N/A")
+    if s["expressions"]:
+        print(f"  Expressions:     {s['expressions']}")
+    if hourly:
+        print("  Hour  frames  detected  focused")
+        for hour, (frames, detected, focused) in enumerate(s["hourly"]):
+            if frames:
+                print(f"  {hour:02d}    {frames:>6}  {detected:>8}  {focused:>7}")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    start = date.fromisoformat(args[0])
+    end = date.fromisoformat(args[1]) if len(args) > 1 else start
+    s = query(start, end)
+    if not s["days"]:
+        print(f"No analysis results between {start} and {end}")
+        sys.exit(1)
+    print_summary(f"{start} to {end} ({len(s['days'])} days)", s, "--hourly" in sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
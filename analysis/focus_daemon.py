@@ -0,0 +1,276 @@
+"""
+Live face/focus analysis: keeps one FaceAnalyzer loaded, analyzes camera frames as they
+arrive and serves the rolling focus state over HTTP.
+
+Frame sources (--source):
+  pi     polls the Pi's /photo (PI_PHOTO_URL, default http://rpi0.local/photo) with the
+         API_KEY environment variable; If-None-Match makes the Pi answer 304 for a frame
+         that was already seen, so unchanged frames cost neither transfer nor analysis
+  dir    watches a directory for new .jpg files (default today's PHOTOS_PATH folder)
+  fake   synthetic photos, for testing without the Pi or a camera
+
+Analysis should take at most --budget-ms per frame: when it runs over, the following
+frames are downscaled further (never below MIN_WIDTH), and scaled back up when there is
+headroom. Frames that were captured more than one poll interval plus the budget (and
+STALE_SLACK) before they reached the daemon (e.g. the newest file of a folder written
+hours ago, or a Pi that stopped capturing) are stale and dropped. The age of a Pi frame
+is measured on the Pi's clock, so clock skew between the machines does not matter.
+
+  GET http://127.0.0.1:8765/state
+
+returns the latest result and, over the last --window seconds, the presence and focus
+ratios, the dominant expression histogram and the current focus streak.
+
+Usage:
+  python focus_daemon.py [--source pi|dir|fake] [--dir D:\\cameraCap\\2026-02-11]
+                         [--interval 2] [--budget-ms 1000] [--window 300] [--port 8765]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from dataclasses import asdict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from face_analyzer import PHOTOS_PATH, FaceAnalyzer
+
+PI_PHOTO_URL = os.environ.get("PI_PHOTO_URL", "http://rpi0.local/photo")
+PORT = 8765
+MAX_WIDTH = 1944  # the camera's full photo width
+MIN_WIDTH = 480
+STALE_SLACK = 2.0  # seconds: HTTP dates have 1 s resolution, plus the Pi's write and our poll delays
+
+
+# ---- frame sources ------------------------------------------------------------
+# next_frame() returns (captured_at, BGR image) or None when there is nothing new.
+
+
+class PiSource:
+    def __init__(self, url: str = PI_PHOTO_URL, api_key: str | None = None):
+        self.url = url
+        self.api_key = api_key or os.environ.get("API_KEY", "")
+        self.etag = None
+
+    def next_frame(self):
+        request = urllib.request.Request(self.url, headers={"X-API-Key": self.api_key})
+        if self.etag:
+            request.add_header("If-None-Match", self.etag)
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                data = response.read()
+                self.etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                served_at = response.headers.get("Date")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        # photo.jpg's mtime on the Pi is the capture time, so a Pi that stopped capturing
+        # (same old frame after a restart of this daemon) is seen as stale. The age is
+        # measured on the Pi's own clock (Date - Last-Modified), the two clocks may differ
+        try:
+            age = (parsedate_to_datetime(served_at) - parsedate_to_datetime(last_modified)).total_seconds()
+        except (TypeError, ValueError):
+            age = 0.0
+        return time.time() - max(0.0, age), img
+
+
+class DirectorySource:
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.seen = set()
+
+    def next_frame(self):
+        folder = self.path or os.path.join(PHOTOS_PATH, datetime.now().strftime("%Y-%m-%d"))
+        if not os.path.isdir(folder):
+            return None
+        new = [f for f in os.listdir(folder) if f.lower().endswith(".jpg") and f not in self.seen]
+        if not new:
+            return None
+        # Only the newest file is worth analyzing, the older ones are already stale
+        self.seen.update(new)
+        path = os.path.join(folder, max(new))
+        img = cv2.imread(path)
+        if img is None:
+            # Probably still being written, try again on the next poll
+            self.seen.discard(max(new))
+            return None
+        return os.stat(path).st_mtime, img
+
+
+class FakeSource:
+    def __init__(self, seed: int = 0):
+        from make_synthetic_dataset import make_photo
+
+        self.make_photo = make_photo
+        self.rng = np.random.default_rng(seed)
+
+    def next_frame(self):
+        return time.time(), self.make_photo(self.rng, present=self.rng.random() < 0.8)
+
+
+# ---- rolling state ----------------------------------------------------------
+
+
+class FocusState:
+    """Results of the last `window` seconds. Shared with the HTTP threads."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.results = deque()  # (analyzed_at, detected, focused, expression)
+        self.latest = None
+        self.focused_since = None
+        self.analyzed = 0
+        self.dropped = 0
+        self.width = None
+        self.last_latency_ms = None
+        self._lock = threading.Lock()
+
+    def add(self, analysis: dict, latency: float, width: int):
+        now = time.time()
+        detected = analysis["presence"]["detected"]
+        focused = bool(analysis["focus"] and analysis["focus"]["is_focused"])
+        expression = analysis["expression"]["dominant"] if analysis["expression"] else None
+        with self._lock:
+            self.results.append((now, detected, focused, expression))
+            while self.results and self.results[0][0] < now - self.window:
+                self.results.popleft()
+            self.latest = analysis
+            self.focused_since = (self.focused_since or now) if focused else None
+            self.analyzed += 1
+            self.width = width
+            self.last_latency_ms = round(latency * 1000, 1)
+
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            results = list(self.results)
+            frames = len(results)
+            detected = sum(1 for r in results if r[1])
+            focused = sum(1 for r in results if r[2])
+            expressions = {}
+            for r in results:
+                if r[3]:
+                    expressions[r[3]] = expressions.get(r[3], 0) + 1
+            return {
+                "updated": datetime.fromtimestamp(results[-1][0]).isoformat(timespec="seconds") if results else None,
+                "window_seconds": self.window,
+                "frames": frames,
+                "present_ratio": round(detected / frames, 3) if frames else None,
+                "focused_ratio": round(focused / detected, 3) if detected else None,
+                "focused_streak_seconds": round(time.time() - self.focused_since, 1) if self.focused_since else 0.0,
+                "expressions": expressions,
+                "latest": self.latest,
+                "analyzed_total": self.analyzed,
+                "dropped_total": self.dropped,
+                "analysis_width": self.width,
+                "last_latency_ms": self.last_latency_ms,
+            }
+
+
+def make_handler(state: FocusState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/state":
+                self.send_error(404)
+                return
+            body = json.dumps(state.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# ---- analysis loop --------------------------------------------------------------
+
+
+def downscale(img: np.ndarray, width: int) -> np.ndarray:
+    h, w = img.shape[:2]
+    if w <= width:
+        return img
+    return cv2.resize(img, (width, round(h * width / w)), interpolation=cv2.INTER_AREA)
+
+
+def run(source, analyzer, state: FocusState, interval: float, budget: float, stop: threading.Event):
+    width = MAX_WIDTH
+    while not stop.is_set():
+        started = time.time()
+        try:
+            frame = source.next_frame()
+        except OSError as e:
+            print(f"Source error: {e}")
+            frame = None
+        if frame is not None:
+            captured_at, img = frame
+            if started - captured_at > interval + budget + STALE_SLACK:
+                state.drop()
+            else:
+                t = time.perf_counter()
+                now = datetime.now()
+                analysis = analyzer.analyze_image(downscale(img, width), now.strftime("%H-%M-%S"), now.strftime("%Y-%m-%d"))
+                elapsed = time.perf_counter() - t
+                state.add(asdict(analysis), elapsed, min(width, img.shape[1]))
+                # Trade resolution for latency: shrink when over budget, grow back with headroom
+                if elapsed > budget:
+                    width = max(MIN_WIDTH, int(width * 0.75))
+                elif elapsed < budget / 4:
+                    width = min(MAX_WIDTH, int(width / 0.75))
+        stop.wait(max(0.0, interval - (time.time() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("pi", "dir", "fake"), default="pi")
+    parser.add_argument("--dir", help="directory to watch with --source dir")
+    parser.add_argument("--url", default=PI_PHOTO_URL)
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="analysis time budget per frame")
+    parser.add_argument("--window", type=float, default=300.0, help="seconds of rolling state")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.source == "pi":
+        source = PiSource(args.url)
+    elif args.source == "dir":
+        source = DirectorySource(args.dir)
+    else:
+        source = FakeSource()
+
+    state = FocusState(args.window)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving focus state at http://127.0.0.1:{args.port}/state (source: {args.source})")
+
+    stop = threading.Event()
+    with FaceAnalyzer() as analyzer:
+        try:
+            run(source, analyzer, state, args.interval, args.budget_ms / 1000, stop)
+        except KeyboardInterrupt:
+            pass
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
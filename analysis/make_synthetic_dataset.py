@@ -0,0 +1,120 @@
+"""
+Generate a synthetic capture archive with the same layout as the real one:
+
+  <root>/screenCap/<date>/<HH-MM-SS>_____DISPLAY1.png   (1600 x 2560)
+  <root>/screenCap/<date>/<HH-MM-SS>_____DISPLAY2.png   (1440 x 2560, DISPLAY5 on some days)
+  <root>/cameraCap/<date>/<HH-MM-SS>.jpg                (2592 x 1944)
+
+Screens are desktop-like (windows with text lines) and change a little between
+consecutive frames, like real screenshots. Some timestamps miss their camera photo or
+second screenshot, so the pairing logic of the tools is exercised too.
+
+Usage:
+  python make_synthetic_dataset.py <root> [--days 2] [--frames 60]
+"""
+
+import argparse
+import os
+from datetime import date, timedelta
+
+import cv2
+import numpy as np
+
+DISPLAY1_SHAPE = (1600, 2560, 3)
+DISPLAY2_SHAPE = (1440, 2560, 3)
+PHOTO_SHAPE = (2592, 1944, 3)
+INTERVAL_SECONDS = 30  # the Windows service captures every 30 s
+
+
+def make_desktop(rng: np.random.Generator, shape: tuple) -> np.ndarray:
+    """A desktop background with a few windows full of text lines."""
+    h, w = shape[:2]
+    img = np.empty(shape, dtype=np.uint8)
+    img[:] = rng.integers(20, 80, size=3)
+    for _ in range(rng.integers(2, 6)):
+        x0, y0 = int(rng.integers(0, w - 400)), int(rng.integers(0, h - 300))
+        x1, y1 = int(min(w, x0 + rng.integers(400, 1400))), int(min(h, y0 + rng.integers(300, 1000)))
+        cv2.rectangle(img, (x0, y0), (x1, y1), tuple(int(c) for c in rng.integers(180, 255, size=3)), -1)
+        cv2.rectangle(img, (x0, y0), (x1, y0 + 30), tuple(int(c) for c in rng.integers(60, 160, size=3)), -1)
+        draw_text_lines(img, rng, x0 + 10, y0 + 60, x1 - 10, y1 - 10)
+    return img
+
+
+def draw_text_lines(img: np.ndarray, rng: np.random.Generator, x0: int, y0: int, x1: int, y1: int):
+    for y in range(y0, y1, 22):
+        length = int(rng.integers(5, 60))
+        text = "".join(chr(c) for c in rng.integers(97, 123, size=length))
+        cv2.putText(img, text, (x0, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (30, 30, 30), 1, cv2.LINE_AA)
+        if cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0][0] + x0 > x1:
+            break
+
+
+def next_screen(prev: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Copy of the previous screen with one small region redrawn (typing, scrolling...)."""
+    img = prev.copy()
+    h, w = img.shape[:2]
+    x0, y0 = int(rng.integers(0, w - 600)), int(rng.integers(0, h - 200))
+    img[y0 : y0 + 200, x0 : x0 + 600] = 240
+    draw_text_lines(img, rng, x0 + 5, y0 + 20, x0 + 595, y0 + 195)
+    return img
+
+
+def make_photo(rng: np.random.Generator, present: bool) -> np.ndarray:
+    """A dim room with sensor noise and, if present, a face-sized blob."""
+    h, w = PHOTO_SHAPE[:2]
+    gradient = np.linspace(40, 110, h, dtype=np.float32)[:, None, None]
+    img = np.broadcast_to(gradient, PHOTO_SHAPE).astype(np.float32)
+    if present:
+        cx, cy = int(w * rng.uniform(0.4, 0.6)), int(h * rng.uniform(0.35, 0.5))
+        cv2.ellipse(img, (cx, cy), (260, 340), 0, 0, 360, (120, 150, 190), -1)
+    img += rng.normal(0, 6, size=PHOTO_SHAPE).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def generate(root: str, days: int, frames: int, start: date, missing_rate: float,
+             display5_rate: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        screen_dir = os.path.join(root, "screenCap", day)
+        camera_dir = os.path.join(root, "cameraCap", day)
+        os.makedirs(screen_dir, exist_ok=True)
+        os.makedirs(camera_dir, exist_ok=True)
+
+        # Some days the second monitor shows up as DISPLAY5, like on the real machine
+        second = "DISPLAY5" if rng.random() < display5_rate else "DISPLAY2"
+        screen1 = make_desktop(rng, DISPLAY1_SHAPE)
+        screen2 = make_desktop(rng, DISPLAY2_SHAPE)
+        seconds = 9 * 3600
+        for _ in range(frames):
+            seconds += INTERVAL_SECONDS * int(rng.choice([1, 1, 1, 2, 10]))
+            ts = f"{seconds // 3600 % 24:02d}-{seconds // 60 % 60:02d}-{seconds % 60:02d}"
+            screen1 = next_screen(screen1, rng)
+            screen2 = next_screen(screen2, rng)
+            cv2.imwrite(os.path.join(screen_dir, f"{ts}_____DISPLAY1.png"), screen1)
+            if rng.random() >= missing_rate:
+                cv2.imwrite(os.path.join(screen_dir, f"{ts}_____{second}.png"), screen2)
+            if rng.random() >= missing_rate:
+                photo = make_photo(rng, present=rng.random() < 0.8)
+                cv2.imwrite(os.path.join(camera_dir, f"{ts}.jpg"), photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        print(f"{day}: {frames} timestamps ({second})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root")
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=60, help="timestamps per day")
+    parser.add_argument("--start", default="2026-01-05", help="first date (yyyy-mm-dd)")
+    parser.add_argument("--missing-rate", type=float, default=0.1,
+                        help="probability that a camera photo or second screenshot is missing")
+    parser.add_argument("--display5-rate", type=float, default=0.3,
+                        help="probability that a day uses DISPLAY5 instead of DISPLAY2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.root, args.days, args.frames, date.fromisoformat(args.start),
+             args.missing_rate, args.display5_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,34 @@ import http.server
 import json
 import os
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import parse_qs, unquote, urlparse
+
+import cv2
+import numpy as np
+
+import day_archive
 
 SCREEN_DIR = Path("D:/screenCap")
 CAMERA_DIR = Path("D:/cameraCap")
 
+# Composited frames for /frame: columns of 20/40/40 % like the page layout
+FRAME_WIDTH = 1920
+FRAME_QUALITY = 80
+FRAME_CACHE = 64  # rendered frames kept in memory
+PREFETCH = 6  # upcoming frames (at the current skip) rendered ahead
+RENDER_THREADS = 4
+
 HTML = """<!DOCTYPE html>
 <html><head><meta charset="utf-8"><title>Player</title>
 <style>
 * { margin: 0; padding: 0; box-sizing: border-box; }
 body { background: #1a1a1a; color: #eee; font-family: sans-serif; }
-#images { display: flex; gap: 4px; padding: 4px; height: calc(100vh - 80px); }
-#images img { object-fit: contain; background: #000; }
-#cam { width: 20%; }
-#scr1, #scr2 { width: 40%; }
+#images { padding: 4px; height: calc(100vh - 80px); }
+#frame { width: 100%; height: 100%; object-fit: contain; background: #000; }
 #controls { display: flex; align-items: center; gap: 12px; padding: 8px 12px;
   background: #222; position: fixed; bottom: 0; width: 100%; height: 44px; }
 #progress { flex: 1; cursor: pointer; }
@@ -26,7 +39,7 @@ select, button { background: #333; color: #eee; border: 1px solid #555;
 #dateSelect { margin-left: auto; }
 </style></head><body>
 <div id="images">
-  <img id="cam"><img id="scr1"><img id="scr2">
+  <img id="frame">
 </div>
 <div id="controls">
   <button id="playBtn" onclick="toggle()">Play</button>
@@ -43,9 +56,8 @@ select, button { background: #333; color: #eee; border: 1px solid #555;
   <select id="dateSelect" onchange="loadDate(this.value)"></select>
 </div>
 <script>
-let frames=[], idx=0, timer=null, skip=1;
-const cam=document.getElementById('cam'), scr1=document.getElementById('scr1'),
-  scr2=document.getElementById('scr2'), prog=document.getElementById('progress'),
+let frames=[], idx=0, timer=null, skip=1, date='';
+const frameImg=document.getElementById('frame'), prog=document.getElementById('progress'),
   timeEl=document.getElementById('time'), playBtn=document.getElementById('playBtn'),
   dateSel=document.getElementById('dateSelect');
 
@@ -55,8 +67,9 @@ async function init() {
   if (dates.length) { dateSel.value = dates[dates.length-1]; loadDate(dateSel.value); }
 }
 
-async function loadDate(date) {
+async function loadDate(d) {
   stop();
+  date = d;
   frames = await (await fetch('/api/frames?date='+date)).json();
   idx = 0;
   prog.max = Math.max(0, frames.length - 1);
@@ -67,10 +80,8 @@ async function loadDate(date) {
 
 function show(i) {
   idx = i;
-  const f = frames[i];
-  cam.src = '/img/' + f.cam;
-  scr1.src = '/img/' + f.scr[0];
-  scr2.src = '/img/' + f.scr[1];
+  // One server-side composited image per frame; skip lets the server render ahead
+  frameImg.src = '/frame?date=' + date + '&i=' + i + '&skip=' + skip;
   prog.value = i;
   update();
 }
@@ -101,49 +112,173 @@ init();
 </script></body></html>"""
 
 
+def get_frames(date):
+    screen_dir = SCREEN_DIR / date
+    camera_dir = CAMERA_DIR / date
+    # Group screenshots by timestamp
+    screens = {}
+    for name in day_archive.list_day(screen_dir):
+        ts = name.split("_____")[0]
+        screens.setdefault(ts, []).append(name)
+    frames = []
+    for ts, files in sorted(screens.items()):
+        if len(files) < 2:
+            continue
+        cam_file = ts + ".jpg"
+        cam_path = camera_dir / cam_file
+        if not cam_path.exists():
+            continue
+        frames.append({
+            "cam": f"cameraCap/{date}/{cam_file}",
+            "scr": [f"screenCap/{date}/{f}" for f in sorted(files)[:2]],
+        })
+    return frames
+
+
+def read_frame_image(path: Path, reduce: int = 1):
+    """Decode a capture (or an archived screenshot), at 1/reduce size for JPEGs."""
+    if path.exists():
+        flags = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}.get(reduce, cv2.IMREAD_COLOR)
+        return cv2.imdecode(np.fromfile(path, dtype=np.uint8), flags)
+    return day_archive.read_path(path)
+
+
+def fit(img, width: int, height: int):
+    """img scaled to fit width x height, or None."""
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    scale = min(width / w, height / h)
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def render_frame(frame: dict) -> bytes:
+    """JPEG of the camera photo and both screenshots side by side (20/40/40 %)."""
+    widths = [FRAME_WIDTH // 5, FRAME_WIDTH * 2 // 5, FRAME_WIDTH - FRAME_WIDTH // 5 - FRAME_WIDTH * 2 // 5]
+    # Screens are 16:10, so the screen columns set the height; the portrait photo is letterboxed
+    height = widths[1] * 10 // 16
+    # Frame entries are "cameraCap/<date>/<file>" and "screenCap/<date>/<file>"
+    paths = [CAMERA_DIR / frame["cam"].split("/", 1)[1]] + [SCREEN_DIR / rel.split("/", 1)[1] for rel in frame["scr"]]
+    # The 1944 px wide photo only needs ~400 px here, JPEG decodes at 1/4 size almost for free
+    images = [read_frame_image(paths[0], 4), read_frame_image(paths[1]), read_frame_image(paths[2])]
+
+    canvas = np.zeros((height, FRAME_WIDTH, 3), dtype=np.uint8)
+    x = 0
+    for img, width in zip(images, widths):
+        img = fit(img, width, height)
+        if img is not None:
+            h, w = img.shape[:2]
+            y0, x0 = (height - h) // 2, x + (width - w) // 2
+            canvas[y0 : y0 + h, x0 : x0 + w] = img
+        x += width
+    return cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, FRAME_QUALITY])[1].tobytes()
+
+
+class FrameRenderer:
+    """Renders composited frames in a worker pool, with a bounded cache of recent and
+    upcoming frames. Safe to call from the server's request threads.
+
+    A future that a request is waiting on is never evicted or cancelled; eviction only
+    drops finished frames and prefetches nobody has asked for yet. When the position
+    moves, prefetches of the same date that are still queued and no longer ahead of it
+    are cancelled, so scrubbing never leaves the pool busy with frames nobody will see.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=RENDER_THREADS)
+        self.cache = OrderedDict()  # (date, i) -> Future of JPEG bytes
+        self.waiters = {}  # (date, i) -> number of requests waiting on its future
+        self.frames = {}  # date -> frame list
+        self.lock = threading.Lock()
+
+    def _frames(self, date: str, i: int) -> list:
+        frames = self.frames.get(date)
+        if frames is None or i >= len(frames):
+            # Today's list grows while the capture service runs
+            frames = self.frames[date] = get_frames(date)
+        return frames
+
+    def _evict(self):
+        for key in list(self.cache):
+            if len(self.cache) <= FRAME_CACHE:
+                break
+            if self.waiters.get(key):
+                continue
+            future = self.cache.pop(key)
+            future.cancel()  # no-op unless it is a queued prefetch
+
+    def get(self, date: str, i: int, skip: int = 1) -> bytes | None:
+        key = (date, i)
+        with self.lock:
+            frames = self._frames(date, i)
+            if not 0 <= i < len(frames):
+                return None
+            ahead = [j for j in (i + k * skip for k in range(1, PREFETCH + 1)) if j < len(frames)]
+            # Queued prefetches of other positions (including this one: a queued frame is
+            # rendered inline below rather than behind the rest of the queue). cancel()
+            # fails for running and finished futures, which stay cached.
+            wanted = set(ahead)
+            for other in [k for k in self.cache if k[0] == date and k[1] not in wanted]:
+                if not self.waiters.get(other) and self.cache[other].cancel():
+                    del self.cache[other]
+            future = self.cache.get(key)
+            if future is not None and (future.cancelled() or (future.done() and future.exception())):
+                del self.cache[key]
+                future = None
+            if future is not None:
+                self.cache.move_to_end(key)
+                self.waiters[key] = self.waiters.get(key, 0) + 1
+            for j in ahead:
+                if (date, j) not in self.cache:
+                    self.cache[(date, j)] = self.executor.submit(render_frame, frames[j])
+            self._evict()
+
+        if future is None:
+            # Render a miss in this request thread, not behind queued prefetches
+            data = render_frame(frames[i])
+            done = Future()
+            done.set_result(data)
+            with self.lock:
+                if key not in self.cache:
+                    self.cache[key] = done
+                    self._evict()
+            return data
+
+        try:
+            return future.result()
+        finally:
+            with self.lock:
+                self.waiters[key] -= 1
+                if not self.waiters[key]:
+                    del self.waiters[key]
+
+
+renderer = FrameRenderer()
+
+
 class Handler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
         path = unquote(self.path)
         if path == "/":
             self._html(HTML)
         elif path == "/api/dates":
-            dates = sorted(d.name for d in SCREEN_DIR.iterdir() if d.is_dir())
+            # Archived days show up as <date>.wpa, with or without the original folder
+            dates = sorted({d.name.removesuffix(day_archive.ARCHIVE_SUFFIX) for d in SCREEN_DIR.iterdir() if d.is_dir()})
             self._json(dates)
         elif path.startswith("/api/frames?date="):
             date = path.split("=", 1)[1]
-            self._json(self._get_frames(date))
+            self._json(get_frames(date))
+        elif path.startswith("/frame?"):
+            self._serve_frame()
         elif path.startswith("/img/"):
             self._serve_file(path[5:])
         else:
             self.send_error(404)
 
-    def _get_frames(self, date):
-        screen_dir = SCREEN_DIR / date
-        camera_dir = CAMERA_DIR / date
-        # Group screenshots by timestamp
-        screens = {}
-        if screen_dir.exists():
-            for f in sorted(screen_dir.iterdir()):
-                ts = f.name.split("_____")[0]
-                screens.setdefault(ts, []).append(f.name)
-        frames = []
-        for ts, files in sorted(screens.items()):
-            if len(files) < 2:
-                continue
-            cam_file = ts + ".jpg"
-            cam_path = camera_dir / cam_file
-            if not cam_path.exists():
-                continue
-            frames.append({
-                "cam": f"cameraCap/{date}/{cam_file}",
-                "scr": [f"screenCap/{date}/{f}" for f in sorted(files)[:2]],
-            })
-        return frames
-
     def _serve_file(self, rel_path):
         full = Path("D:/") / rel_path
         if not full.exists():
-            self.send_error(404)
+            self._serve_archived(full)
             return
         ext = full.suffix.lower()
         ct = {".png": "image/png", ".jpg": "image/jpeg", ".bmp": "image/bmp"}.get(ext, "application/octet-stream")
@@ -155,6 +290,43 @@ class Handler(http.server.BaseHTTPRequestHandler):
             while chunk := f.read(65536):
                 self.wfile.write(chunk)
 
+    def _serve_frame(self):
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            date = query["date"][0]
+            i = int(query["i"][0])
+            skip = max(1, int(query.get("skip", ["1"])[0]))
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        try:
+            data = renderer.get(date, i, skip)
+        except Exception as e:
+            self.send_error(500, f"Cannot render frame: {e}")
+            return
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve_archived(self, full):
+        img = day_archive.read_path(full)
+        if img is None:
+            self.send_error(404)
+            return
+        data = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, 1])[1].tobytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
     def _html(self, content):
         self.send_response(200)
         self.send_header("Content-Type", "text/html; charset=utf-8")
@@ -171,6 +343,8 @@ class Handler(http.server.BaseHTTPRequestHandler):
         pass  # suppress logs
 
 
-port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
-print(f"http://localhost:{port}")
-http.server.HTTPServer(("", port), Handler).serve_forever()
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    print(f"http://localhost:{port}")
+    http.server.ThreadingHTTPServer(("", port), Handler).serve_forever()
+
@@ -0,0 +1,146 @@
+"""
+Lightweight per-stage timers and counters for the analysis scripts.
+
+    with profiling.stage("decode"):
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    profiling.count("frames")
+
+Disabled by default: stage() then returns a shared no-op context manager and count()
+returns immediately. Set WILLPOWER_PROFILE to an output prefix to enable it for any
+script, e.g.
+
+    WILLPOWER_PROFILE=profile/nightly python run_analysis.py 2026-02-11
+
+At exit this writes <prefix>.json (per-stage count, total and percentiles, counters)
+and <prefix>.trace.json (Chrome trace, open in chrome://tracing or Perfetto).
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+# Trace events are kept up to this many, stage statistics are always complete
+MAX_TRACE_EVENTS = 200000
+
+_enabled = False
+_lock = threading.Lock()
+_durations = defaultdict(list)  # stage -> [seconds]
+_counters = defaultdict(int)
+_events = []  # (stage, start_ns, duration_ns, thread id)
+_origin_ns = time.perf_counter_ns()
+_NULL = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        with _lock:
+            _durations[self.name].append(duration / 1e9)
+            if len(_events) < MAX_TRACE_EVENTS:
+                _events.append((self.name, self.start, duration, threading.get_ident()))
+
+
+def stage(name: str):
+    """Context manager timing one occurrence of a stage."""
+    if not _enabled:
+        return _NULL
+    return _Stage(name)
+
+
+def count(name: str, n: int = 1):
+    """Add n to a named counter."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(prefix: str | None = None):
+    """Turn profiling on. With a prefix, the reports are written there at exit."""
+    global _enabled
+    _enabled = True
+    if prefix:
+        atexit.register(write, prefix)
+
+
+def summary() -> dict:
+    """Per-stage count, total and latency percentiles (ms), plus the counters."""
+    import numpy as np
+
+    with _lock:
+        durations = {name: np.array(values) for name, values in _durations.items()}
+        counters = dict(_counters)
+    stages = {}
+    for name, values in sorted(durations.items(), key=lambda kv: -kv[1].sum()):
+        p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+        stages[name] = {
+            "count": len(values),
+            "total_s": round(float(values.sum()), 4),
+            "mean_ms": round(float(values.mean()) * 1000, 3),
+            "p50_ms": round(float(p50), 3),
+            "p90_ms": round(float(p90), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(values.max()) * 1000, 3),
+        }
+    return {"stages": stages, "counters": counters}
+
+
+def chrome_trace() -> dict:
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    return {
+        "traceEvents": [
+            {
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": (start - _origin_ns) / 1000,
+                "dur": duration / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start, duration, tid in events
+        ],
+        "displayTimeUnit": "ms",
+    }
+
+
+def write(prefix: str):
+    """Write <prefix>.json and <prefix>.trace.json and print the per-stage table."""
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    report = summary()
+    with open(prefix + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(prefix + ".trace.json", "w") as f:
+        json.dump(chrome_trace(), f)
+
+    print(f"\nProfile ({prefix}.json, {prefix}.trace.json):")
+    print(f"  {'stage':<16} {'count':>8} {'total s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for name, s in report["stages"].items():
+        print(f"  {name:<16} {s['count']:>8} {s['total_s']:>9} {s['p50_ms']:>9} {s['p90_ms']:>9} {s['p99_ms']:>9}")
+    for name, value in report["counters"].items():
+        print(f"  {name}: {value}")
+
+
+if os.environ.get("WILLPOWER_PROFILE"):
+    enable(os.environ["WILLPOWER_PROFILE"])
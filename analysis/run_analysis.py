@@ -0,0 +1,357 @@
+"""
+Nightly analysis runner: walks a date range once, decodes every capture once and
+fans the decoded images out to the registered consumers:
+
+  accumulate  composite sums, same output as create_images_memory_efficient.py
+  clip        CLIP embeddings, same .npz files as vectorize_screenshots.py
+  face        FaceLandmarker results, same analysis.json as face_analyzer.py
+  thumbnails  small JPEG previews
+
+Each consumer keeps its own resumable state and says per frame which images it still
+needs, so a file is only read and decoded if at least one consumer wants it.
+
+Usage:
+  python run_analysis.py 2026-02-01 2026-02-11 [--consumers accumulate,clip,face,thumbnails]
+"""
+
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import day_archive
+import profiling
+from create_images_memory_efficient import (
+    OUTPUT_PATH,
+    PHOTOS_PATH,
+    SCREENSHOTS_PATH,
+    Checkpoint,
+    CompositeStatistics,
+    frame_paths,
+    get_date_list,
+    read_image,
+    save_statistics,
+)
+
+KINDS = ("camera", "display1", "display2")
+SHAPES = {"camera": (2592, 1944, 3), "display1": (1600, 2560, 3), "display2": (1440, 2560, 3)}
+STATE_DIR = os.path.join(OUTPUT_PATH, "run_analysis")
+THUMBNAILS_PATH = os.path.join(OUTPUT_PATH, "thumbnails")
+THUMBNAIL_WIDTH = 320
+NUM_THREADS = 8
+
+
+@dataclass
+class Frame:
+    date: str
+    timestamp: str
+    paths: dict[str, str]
+    images: dict[str, np.ndarray] = field(default_factory=dict)
+
+
+class Consumer:
+    """Receives decoded frames. Subclasses keep their own resumable state."""
+
+    name = ""
+
+    def start_date(self, date: str):
+        pass
+
+    def needs(self, frame: Frame) -> set[str]:
+        """Kinds of images this consumer still needs for the frame (empty = skip)."""
+        return set()
+
+    def consume(self, frame: Frame):
+        """Only called for frames this consumer needed something from."""
+        pass
+
+    def finish_date(self, date: str):
+        """Persist state, called after the last frame of a date."""
+        pass
+
+    def close(self):
+        pass
+
+
+class AccumulateConsumer(Consumer):
+    """Sums DISPLAY1/DISPLAY2 (and optionally camera) images like mix_images.
+
+    Uses the same two-slot Checkpoint as mix_images, written after every date.
+    """
+
+    name = "accumulate"
+
+    def __init__(self, include_camera: bool, output_name: str):
+        self.include_camera = include_camera
+        self.output_name = output_name
+        self.kinds = KINDS if include_camera else KINDS[1:]
+        self.stats = CompositeStatistics(include_camera, ("mean",))
+        self.checkpoint = Checkpoint(
+            os.path.join(STATE_DIR, f"accumulate_{output_name}"), self.stats.arrays(), include_camera, ("mean",)
+        )
+        self.count, self.processed, self.stats.date = self.checkpoint.load()
+        if self.count:
+            print(f"[accumulate] resuming with {self.count} frames")
+        self.new = []
+
+    def needs(self, frame):
+        if (frame.date, frame.timestamp) in self.processed:
+            return set()
+        if not all(day_archive.exists(frame.paths[kind]) for kind in self.kinds):
+            return set()
+        return set(self.kinds)
+
+    def consume(self, frame):
+        entry = (frame.date, frame.timestamp)
+        self.processed.add(entry)
+        self.new.append(entry)
+        images = {kind: frame.images.get(kind) for kind in self.kinds}
+        if any(img is None or img.shape != SHAPES[kind] for kind, img in images.items()):
+            return
+        self.stats.add(frame.date, images)
+        self.count += 1
+
+    def finish_date(self, date):
+        if self.new:
+            self.checkpoint.save(self.count, self.new, self.stats.date)
+            self.new = []
+
+    def close(self):
+        if self.count == 0:
+            print("[accumulate] no valid frames")
+            return
+        save_statistics(self.output_name, self.stats)
+        print(f"[accumulate] composite of {self.count} frames saved as {self.output_name}")
+
+
+class ClipConsumer(Consumer):
+    """Encodes screenshots with CLIP and appends them to the vectorizer's .npz files."""
+
+    name = "clip"
+
+    def __init__(self):
+        from vectorize_screenshots import BATCH_SIZE, ENCODER_BACKEND, OUTPUT_DIR, load_encoder, load_existing
+
+        self.batch_size = BATCH_SIZE
+        self.output_dir = OUTPUT_DIR
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.already_done = load_existing(self.output_dir)
+        self.model = load_encoder(ENCODER_BACKEND)
+        self.pending = []
+        self.embeddings = []
+        self.paths = []
+
+    def needs(self, frame):
+        from vectorize_screenshots import screenshot_key
+
+        return {
+            kind for kind in KINDS[1:]
+            if day_archive.exists(frame.paths[kind]) and screenshot_key(frame.paths[kind]) not in self.already_done
+        }
+
+    def consume(self, frame):
+        from PIL import Image
+        from vectorize_screenshots import screenshot_key
+
+        for kind in KINDS[1:]:
+            key = screenshot_key(frame.paths[kind])
+            img = frame.images.get(kind)
+            if img is None or key in self.already_done:
+                continue
+            self.pending.append((frame.paths[kind], key, Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        paths, keys, images = zip(*self.pending)
+        with profiling.stage("model_encode"):
+            self.embeddings.append(self.model.encode(list(images), batch_size=self.batch_size, show_progress_bar=False))
+        # The path the frame was really read from, so search results can be opened;
+        # dedup against the vectorizer goes through screenshot_key, whatever the root
+        self.paths.extend(paths)
+        self.already_done.update(keys)
+        self.pending = []
+
+    def finish_date(self, date):
+        from vectorize_screenshots import save_embeddings
+
+        self._flush()
+        if self.paths:
+            save_embeddings(self.output_dir, date, np.vstack(self.embeddings), self.paths)
+        self.embeddings = []
+        self.paths = []
+
+
+class FaceConsumer(Consumer):
+    """Runs FaceLandmarker on camera photos and merges into each day's analysis.json."""
+
+    name = "face"
+
+    def __init__(self):
+        from face_analyzer import FaceAnalyzer
+
+        self.analyzer = FaceAnalyzer()
+        self.results = {}
+        self.new = 0
+
+    def start_date(self, date):
+        self.results = {}
+        path = os.path.join(PHOTOS_PATH, date, "analysis.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                self.results = {r["timestamp"]: r for r in json.load(f)}
+        self.new = 0
+
+    def needs(self, frame):
+        if frame.timestamp in self.results or not os.path.exists(frame.paths["camera"]):
+            return set()
+        return {"camera"}
+
+    def consume(self, frame):
+        if "camera" not in frame.images:
+            return
+        analysis = self.analyzer.analyze_image(frame.images["camera"], frame.timestamp, frame.date)
+        self.results[frame.timestamp] = asdict(analysis)
+        self.new += 1
+
+    def finish_date(self, date):
+        from face_analyzer import save_analysis
+
+        if self.new:
+            save_analysis(os.path.join(PHOTOS_PATH, date), [self.results[ts] for ts in sorted(self.results)])
+
+    def close(self):
+        self.analyzer.__exit__(None, None, None)
+
+
+class ThumbnailConsumer(Consumer):
+    """Writes THUMBNAIL_WIDTH-wide JPEG previews, skipping ones that already exist."""
+
+    name = "thumbnails"
+
+    def _thumb_path(self, frame, kind):
+        name = os.path.splitext(os.path.basename(frame.paths[kind]))[0] + ".jpg"
+        return os.path.join(THUMBNAILS_PATH, frame.date, name)
+
+    def needs(self, frame):
+        return {
+            kind for kind in KINDS
+            if day_archive.exists(frame.paths[kind]) and not os.path.exists(self._thumb_path(frame, kind))
+        }
+
+    def consume(self, frame):
+        for kind, img in frame.images.items():
+            path = self._thumb_path(frame, kind)
+            if os.path.exists(path):
+                continue
+            h, w = img.shape[:2]
+            thumb = cv2.resize(img, (THUMBNAIL_WIDTH, h * THUMBNAIL_WIDTH // w), interpolation=cv2.INTER_AREA)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            cv2.imwrite(path, thumb, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+
+def list_timestamps(date: str) -> list[str]:
+    """Every timestamp that has a camera photo or a screenshot on this date."""
+    timestamps = set()
+    photos_dir = os.path.join(PHOTOS_PATH, date)
+    if os.path.isdir(photos_dir):
+        timestamps.update(f.split(".")[0] for f in os.listdir(photos_dir) if f.lower().endswith(".jpg"))
+    screenshots_dir = os.path.join(SCREENSHOTS_PATH, date)
+    timestamps.update(f.split("_____")[0] for f in day_archive.list_day(screenshots_dir) if "_____" in f)
+    return sorted(timestamps)
+
+
+def decode_frame(frame: Frame, kinds: set[str]) -> Frame:
+    for kind in kinds:
+        img = read_image(frame.paths[kind])
+        if img is not None:
+            frame.images[kind] = img
+    return frame
+
+
+def decoded_frames(jobs, executor, window):
+    """Decode in the pool but yield in submission order, with at most `window` frames in flight."""
+    in_flight = deque()
+    for frame, kinds, wanted_by in jobs:
+        in_flight.append((executor.submit(decode_frame, frame, kinds), wanted_by))
+        if len(in_flight) >= window:
+            future, wanted_by = in_flight.popleft()
+            yield future.result(), wanted_by
+    while in_flight:
+        future, wanted_by = in_flight.popleft()
+        yield future.result(), wanted_by
+
+
+def run(date_list: list[str], consumers: list[Consumer], num_threads: int = NUM_THREADS):
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for date in date_list:
+            timestamps = list_timestamps(date)
+            if not timestamps:
+                continue
+            for consumer in consumers:
+                consumer.start_date(date)
+
+            jobs = []
+            for ts in timestamps:
+                photo_path, display1_path, display2_path = frame_paths(date, ts)
+                frame = Frame(date, ts, {"camera": photo_path, "display1": display1_path, "display2": display2_path})
+                needs = [(consumer, consumer.needs(frame)) for consumer in consumers]
+                wanted_by = [consumer for consumer, kinds in needs if kinds]
+                if wanted_by:
+                    jobs.append((frame, set().union(*(kinds for _, kinds in needs)), wanted_by))
+            print(f"{date}: {len(jobs)}/{len(timestamps)} timestamps to decode")
+
+            for i, (frame, wanted_by) in enumerate(decoded_frames(jobs, executor, num_threads * 2), 1):
+                for consumer in wanted_by:
+                    with profiling.stage(consumer.name):
+                        consumer.consume(frame)
+                profiling.count("frames")
+                if i % 200 == 0:
+                    print(f"  {i}/{len(jobs)}")
+
+            for consumer in consumers:
+                consumer.finish_date(date)
+
+    for consumer in consumers:
+        consumer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("start_date", help="yyyy-mm-dd")
+    parser.add_argument("end_date", nargs="?", help="yyyy-mm-dd (default: start_date)")
+    parser.add_argument("--consumers", default="accumulate,clip,face,thumbnails")
+    parser.add_argument("--include-camera", action="store_true", help="include camera photos in the composite")
+    parser.add_argument("--threads", type=int, default=NUM_THREADS)
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(args.end_date or args.start_date, "%Y-%m-%d").date()
+    names = [n.strip() for n in args.consumers.split(",") if n.strip()]
+
+    consumers = []
+    for name in names:
+        if name == "accumulate":
+            consumers.append(AccumulateConsumer(args.include_camera, f"{start_date}_to_{end_date}"))
+        elif name == "clip":
+            consumers.append(ClipConsumer())
+        elif name == "face":
+            consumers.append(FaceConsumer())
+        elif name == "thumbnails":
+            consumers.append(ThumbnailConsumer())
+        else:
+            parser.error(f"unknown consumer: {name}")
+
+    run(get_date_list(start_date, end_date), consumers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Text-to-screenshot semantic search over the CLIP embeddings from vectorize_screenshots.py.
+
+The index lives in analysis/embeddings/index/ and is updated incrementally: only days
+(or the rows appended to a day) that are not indexed yet are added. Vectors are
+L2-normalized and stored as raw float16, so cosine similarity is a dot product and
+the matrix can be memory-mapped.
+
+Two search modes:
+  exact  brute-force over all vectors (the default while the float32 copy fits in
+         EXACT_CACHE_BYTES; larger indexes use IVF once it is trained)
+  ivf    inverted lists + product quantization, then exact re-ranking of the best
+         candidates. Train it once with --train-ivf; new rows are encoded on update.
+
+Usage:
+  python search_screenshots.py                    # update index, then prompt for queries
+  python search_screenshots.py --ivf "a query"    # one-shot query in IVF mode
+  python search_screenshots.py --exact "a query"  # exact search even on a large index
+  python search_screenshots.py --train-ivf        # (re)train the IVF/PQ quantizers
+"""
+
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from vectorize_screenshots import MODEL_NAME, OUTPUT_DIR
+
+INDEX_DIR = OUTPUT_DIR.parent / "index"
+TOP_K = 10
+
+# Exact search keeps a float32 copy in RAM up to this size, larger indexes are
+# scored chunk by chunk straight from the float16 memmap.
+EXACT_CACHE_BYTES = 1 << 30
+SCORE_CHUNK = 65536
+
+# IVF / PQ settings
+IVF_LISTS = 256
+IVF_PROBES = 16
+PQ_SUBVECTORS = 32  # 512 dims -> 16 dims per sub-vector, one byte code each
+PQ_CENTROIDS = 256
+RERANK = 256  # candidates re-scored with the exact vectors
+TRAIN_SAMPLES = 50000
+KMEANS_ITERS = 20
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    """L2-normalize along the last axis (float32)."""
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def assign_nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for every row of data."""
+    c_norms = (centroids * centroids).sum(axis=1)
+    labels = np.empty(len(data), dtype=np.int32)
+    for i in range(0, len(data), SCORE_CHUNK):
+        chunk = data[i : i + SCORE_CHUNK]
+        labels[i : i + SCORE_CHUNK] = np.argmin(c_norms - 2.0 * chunk @ centroids.T, axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd k-means (squared L2), used for the IVF lists and the PQ codebooks."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        labels = assign_nearest(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.searchsorted(labels[order], nonempty)
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        # Empty clusters keep their previous centroid
+        centroids[nonempty] = sums / counts[nonempty, None]
+    return centroids
+
+
+class ScreenshotIndex:
+    """Append-only on-disk index of normalized float16 screenshot embeddings."""
+
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.index_dir / "manifest.json"
+        self.vectors_path = self.index_dir / "vectors.f16"
+        self.paths_path = self.index_dir / "paths.txt"
+        self.ivf_path = self.index_dir / "ivf.npz"
+        self.assign_path = self.index_dir / "ivf_assign.i32"
+        self.codes_path = self.index_dir / "ivf_codes.u8"
+        self._load()
+
+    # ---- storage -----------------------------------------------------------
+
+    def _load(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"model": MODEL_NAME, "dim": 0, "rows": 0, "days": {}}
+        if self.manifest["model"] != MODEL_NAME:
+            print(f"Index was built with {self.manifest['model']}, rebuilding for {MODEL_NAME}")
+            self.reset()
+            return
+
+        rows, dim = self.manifest["rows"], self.manifest["dim"]
+        # Drop anything appended after the last manifest write (interrupted update)
+        self._truncate(self.vectors_path, rows * dim * 2)
+        self._truncate(self.assign_path, rows * 4)
+        self._truncate(self.codes_path, rows * PQ_SUBVECTORS)
+
+        self.vectors = (
+            np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(rows, dim)) if rows else None
+        )
+        self.paths = []
+        if self.paths_path.exists():
+            with open(self.paths_path, encoding="utf-8") as f:
+                self.paths = f.read().splitlines()
+            if len(self.paths) > rows:
+                self.paths = self.paths[:rows]
+                with open(self.paths_path, "w", encoding="utf-8") as f:
+                    f.writelines(p + "\n" for p in self.paths)
+        self._matrix = None
+        self._chunk = None
+
+        self.ivf = None
+        if self.ivf_path.exists():
+            data = np.load(self.ivf_path)
+            self.ivf = {"coarse": data["coarse"], "codebooks": data["codebooks"]}
+            self._build_lists()
+
+    @staticmethod
+    def _truncate(path: Path, size: int):
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _write_manifest(self):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def reset(self):
+        for p in (self.manifest_path, self.vectors_path, self.paths_path,
+                  self.ivf_path, self.assign_path, self.codes_path):
+            if p.exists():
+                p.unlink()
+        self._load()
+
+    def _append(self, vectors: np.ndarray, paths: list[str]):
+        vectors = normalize(vectors)
+        if self.manifest["dim"] == 0:
+            self.manifest["dim"] = vectors.shape[1]
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.astype(np.float16).tobytes())
+        with open(self.paths_path, "a", encoding="utf-8") as f:
+            f.writelines(p + "\n" for p in paths)
+        if self.ivf is not None:
+            assign, codes = self._encode_ivf(vectors)
+            with open(self.assign_path, "ab") as f:
+                f.write(assign.tobytes())
+            with open(self.codes_path, "ab") as f:
+                f.write(codes.tobytes())
+        self.manifest["rows"] += len(paths)
+
+    # ---- incremental update ------------------------------------------------
+
+    def update(self, embeddings_dir: Path = OUTPUT_DIR) -> int:
+        """Index new days and new rows of existing days. Returns the number of rows added."""
+        days = self.manifest["days"]
+        added = 0
+        for npz_file in sorted(Path(embeddings_dir).glob("*.npz")):
+            date = npz_file.stem
+            mtime = npz_file.stat().st_mtime
+            indexed = days.get(date)
+            if indexed is not None and indexed["mtime"] == mtime:
+                continue  # unchanged since last update, don't even decompress it
+
+            data = np.load(npz_file, allow_pickle=True)
+            embeddings, paths = data["embeddings"], data["paths"].tolist()
+            done = indexed["rows"] if indexed else 0
+            if len(paths) < done:
+                # vectorize_screenshots only ever appends, so this day was rebuilt
+                print(f"{date} shrank from {done} to {len(paths)} rows, rebuilding the index")
+                self.reset()
+                return self.update(embeddings_dir)
+
+            if len(paths) > done:
+                self._append(embeddings[done:], paths[done:])
+                added += len(paths) - done
+            days[date] = {"rows": len(paths), "mtime": mtime}
+            self._write_manifest()
+
+        if added:
+            self._load()
+        return added
+
+    # ---- IVF / PQ ----------------------------------------------------------
+
+    def train_ivf(self, n_lists: int = IVF_LISTS):
+        """Train coarse centroids and PQ codebooks on a sample, then encode every row."""
+        rows = self.manifest["rows"]
+        if rows == 0:
+            print("Index is empty, nothing to train on.")
+            return
+        rng = np.random.default_rng(0)
+        sample_idx = np.sort(rng.choice(rows, min(rows, TRAIN_SAMPLES), replace=False))
+        sample = np.asarray(self.vectors[sample_idx], dtype=np.float32)
+
+        print(f"Training {n_lists} IVF lists on {len(sample)} vectors...")
+        coarse = kmeans(sample, n_lists)
+        residuals = sample - coarse[assign_nearest(sample, coarse)]
+
+        print(f"Training {PQ_SUBVECTORS} PQ codebooks...")
+        sub = residuals.shape[1] // PQ_SUBVECTORS
+        codebooks = np.stack([
+            kmeans(residuals[:, j * sub : (j + 1) * sub], PQ_CENTROIDS, seed=j)
+            for j in range(PQ_SUBVECTORS)
+        ])
+        np.savez(self.ivf_path, coarse=coarse, codebooks=codebooks)
+        self.ivf = {"coarse": coarse, "codebooks": codebooks}
+
+        print("Encoding all rows...")
+        with open(self.assign_path, "wb") as fa, open(self.codes_path, "wb") as fc:
+            for i in range(0, rows, SCORE_CHUNK):
+                assign, codes = self._encode_ivf(np.asarray(self.vectors[i : i + SCORE_CHUNK], dtype=np.float32))
+                fa.write(assign.tobytes())
+                fc.write(codes.tobytes())
+        self._build_lists()
+
+    def _encode_ivf(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        coarse, codebooks = self.ivf["coarse"], self.ivf["codebooks"]
+        assign = assign_nearest(vectors, coarse)
+        residuals = vectors - coarse[assign]
+        sub = codebooks.shape[2]
+        codes = np.empty((len(vectors), len(codebooks)), dtype=np.uint8)
+        for j, codebook in enumerate(codebooks):
+            codes[:, j] = assign_nearest(residuals[:, j * sub : (j + 1) * sub], codebook)
+        return assign, codes
+
+    def _build_lists(self):
+        """Group row ids by IVF list so a probe only touches its own rows."""
+        rows = self.manifest["rows"]
+        if not self.assign_path.exists() or self.assign_path.stat().st_size < rows * 4:
+            print("IVF codes are missing rows, run with --train-ivf")
+            self.ivf = None
+            return
+        assign = np.fromfile(self.assign_path, dtype=np.int32, count=rows)
+        self.list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        self.list_offsets = np.searchsorted(assign[self.list_rows], np.arange(len(self.ivf["coarse"]) + 1))
+        self.codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(rows, PQ_SUBVECTORS))
+
+    # ---- search ------------------------------------------------------------
+
+    def _exact_scores(self, query: np.ndarray) -> np.ndarray:
+        rows, dim = self.manifest["rows"], self.manifest["dim"]
+        if self._matrix is None and rows * dim * 4 <= EXACT_CACHE_BYTES:
+            self._matrix = np.asarray(self.vectors, dtype=np.float32)
+        if self._matrix is not None:
+            return self._matrix @ query
+        # One float32 buffer reused for every chunk instead of a new array per chunk
+        if self._chunk is None:
+            self._chunk = np.empty((min(rows, SCORE_CHUNK), dim), dtype=np.float32)
+        scores = np.empty(rows, dtype=np.float32)
+        for i in range(0, rows, SCORE_CHUNK):
+            n = min(SCORE_CHUNK, rows - i)
+            self._chunk[:n] = self.vectors[i : i + n]
+            np.dot(self._chunk[:n], query, out=scores[i : i + n])
+        return scores
+
+    def exact_is_slow(self) -> bool:
+        """True if exact search converts float16 chunks on every query (too big to cache)."""
+        return self.manifest["rows"] * self.manifest["dim"] * 4 > EXACT_CACHE_BYTES
+
+    def _ivf_candidates(self, query: np.ndarray, n_probes: int) -> np.ndarray:
+        """Rows of the best-matching lists, ranked by their PQ approximation."""
+        coarse, codebooks = self.ivf["coarse"], self.ivf["codebooks"]
+        coarse_scores = coarse @ query
+        probes = top_k(coarse_scores, n_probes)
+        sizes = self.list_offsets[probes + 1] - self.list_offsets[probes]
+        rows = np.concatenate([self.list_rows[self.list_offsets[p] : self.list_offsets[p + 1]] for p in probes])
+        if len(rows) == 0:
+            return rows
+
+        # lut[j, c] = <query sub-vector j, codeword c>, so <query, residual> is a sum of lookups
+        sub = codebooks.shape[2]
+        lut = np.einsum("jcd,jd->jc", codebooks, query.reshape(len(codebooks), sub))
+        # Reading the codes in row order keeps the memmap access sequential
+        order = np.argsort(rows)
+        rows = rows[order]
+        approx = np.repeat(coarse_scores[probes], sizes)[order]
+        approx += lut[np.arange(len(codebooks)), self.codes[rows]].sum(axis=1)
+        return rows[top_k(approx, RERANK)]
+
+    def search(self, query: np.ndarray, k: int = TOP_K, mode: str = "exact",
+               n_probes: int = IVF_PROBES) -> list[tuple[str, float]]:
+        """Return the top-k (path, cosine score) pairs for a normalized query vector."""
+        if self.manifest["rows"] == 0:
+            return []
+        query = normalize(query)
+        if mode == "ivf" and self.ivf is not None:
+            rows = self._ivf_candidates(query, n_probes)
+            if len(rows) == 0:
+                return []
+            rows = np.sort(rows)
+            scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+            best = top_k(scores, k)
+            return [(self.paths[rows[i]], float(scores[i])) for i in best]
+        scores = self._exact_scores(query)
+        return [(self.paths[i], float(scores[i])) for i in top_k(scores, k)]
+
+
+_model = None
+
+
+def load_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+
+        print(f"Loading model: {MODEL_NAME}")
+        _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+
+@lru_cache(maxsize=256)
+def encode_query(text: str) -> np.ndarray:
+    """Encode a text query with the same CLIP model as the screenshots (cached)."""
+    vec = normalize(load_model().encode([text], show_progress_bar=False)[0])
+    vec.setflags(write=False)
+    return vec
+
+
+def run_query(index: ScreenshotIndex, text: str, mode: str):
+    t0 = time.perf_counter()
+    query = encode_query(text)
+    t1 = time.perf_counter()
+    results = index.search(query, TOP_K, mode)
+    t2 = time.perf_counter()
+    for path, score in results:
+        print(f"  {score:.3f}  {path}")
+    print(f"  (encode {(t1 - t0) * 1000:.1f} ms, search {(t2 - t1) * 1000:.1f} ms, {mode})")
+
+
+def main():
+    args = sys.argv[1:]
+    mode = "ivf" if "--ivf" in args else "exact"
+    train = "--train-ivf" in args
+    queries = [a for a in args if not a.startswith("--")]
+
+    index = ScreenshotIndex()
+    added = index.update()
+    print(f"Index: {index.manifest['rows']} screenshots, {added} added")
+
+    if train:
+        index.train_ivf()
+        if not queries:
+            return
+    if mode == "ivf" and index.ivf is None:
+        print("IVF quantizers not trained (use --train-ivf), falling back to exact search")
+        mode = "exact"
+    elif mode == "exact" and index.exact_is_slow() and "--exact" not in args:
+        # Past EXACT_CACHE_BYTES every exact query converts the whole float16 matrix
+        if index.ivf is not None:
+            print(f"{index.manifest['rows']} screenshots is too many for fast exact search, using IVF "
+                  "(pass --exact to force exact search)")
+            mode = "ivf"
+        else:
+            print(f"Exact search over {index.manifest['rows']} screenshots takes seconds per query; "
+                  "train IVF with --train-ivf for millisecond searches")
+
+    for text in queries:
+        print(f"\n{text}")
+        run_query(index, text, mode)
+    if queries:
+        return
+
+    while True:
+        try:
+            text = input("\nQuery (empty to exit): ").strip()
+        except EOFError:
+            break
+        if not text:
+            break
+        run_query(index, text, mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,312 @@
 """
 Vectorize all screenCap images using CLIP (clip-ViT-B-32).
 Saves embeddings as .npz files in analysis/embeddings/screen/
+
+The image encoder backend is chosen with the CLIP_BACKEND environment variable:
+  torch      the fp32 SentenceTransformer model (default)
+  int8       vision tower with dynamically quantized int8 Linear layers, TorchScript
+  bf16       vision tower under CPU bfloat16 autocast (only where the CPU supports it)
+  onnx-int8  vision tower exported to ONNX and quantized to int8, run by onnxruntime
+Exported models are cached in analysis/models/. Before a backend is used the first time,
+its embeddings are compared with the fp32 ones on a sample of screenshots; if the lowest
+cosine similarity is below COSINE_THRESHOLD, the fp32 model is used instead.
 """
 
+import json
 import os
 import glob
+import time
 import numpy as np
 from pathlib import Path
 from PIL import Image
-from sentence_transformers import SentenceTransformer
+
+import day_archive
+import profiling
 
 SCRIPT_DIR = Path(__file__).parent
 SCREENCAP_DIR = SCRIPT_DIR / "screenCap"
 OUTPUT_DIR = SCRIPT_DIR / "embeddings" / "screen"
 BATCH_SIZE = 64
 MODEL_NAME = "clip-ViT-B-32"
+MODELS_DIR = SCRIPT_DIR / "models"
+ENCODER_BACKEND = os.environ.get("CLIP_BACKEND", "torch")
+BACKENDS = ("torch", "int8", "bf16", "onnx-int8")
+COSINE_THRESHOLD = 0.98
+VALIDATION_IMAGES = 32
 
 
 def collect_images(screencap_dir: Path) -> list[str]:
-    """Recursively collect all .png files from screenCap subdirectories."""
-    paths = sorted(glob.glob(str(screencap_dir / "**" / "*.png"), recursive=True))
+    """Recursively collect all .png files from screenCap subdirectories,
+    including the ones moved into day archives (listed under their original path)."""
+    paths = set(glob.glob(str(screencap_dir / "**" / "*.png"), recursive=True))
+    for archive_path in screencap_dir.glob("*" + day_archive.ARCHIVE_SUFFIX):
+        day_dir = archive_path.with_name(archive_path.name[: -len(day_archive.ARCHIVE_SUFFIX)])
+        archive = day_archive.open_archive(day_dir)
+        if archive is None:
+            # No index.npz yet: the first archive run of that day was interrupted
+            continue
+        paths.update(str(day_dir / name) for name in archive.names())
+    paths = sorted(paths)
     print(f"Found {len(paths)} images in {screencap_dir}")
     return paths
 
 
+def screenshot_key(path) -> str:
+    """"<date>/<file name>", the same for a screenshot whichever root it was read from."""
+    path = Path(path)
+    return f"{path.parent.name}/{path.name}"
+
+
 def load_existing(output_dir: Path) -> set[str]:
-    """Load paths already processed from existing .npz files."""
+    """Keys (see screenshot_key) of the screenshots already in existing .npz files."""
     already_done = set()
     if not output_dir.exists():
         return already_done
     for npz_file in output_dir.glob("*.npz"):
         data = np.load(npz_file, allow_pickle=True)
-        already_done.update(data["paths"].tolist())
+        already_done.update(screenshot_key(p) for p in data["paths"].tolist())
     return already_done
 
 
+def open_image(path: str) -> Image.Image:
+    """Decode a screenshot as RGB, from the file or from its day archive."""
+    if os.path.exists(path):
+        with profiling.stage("pil_decode"):
+            return Image.open(path).convert("RGB")
+    with profiling.stage("archive_read"):
+        img = day_archive.read_path(path)
+    if img is None:
+        raise FileNotFoundError(path)
+    return Image.fromarray(img[:, :, ::-1])
+
+
+def _vision_tower(clip_model):
+    """Image half of the CLIP model: pixel_values -> projected image embedding,
+    computed the same way as sentence_transformers' CLIPModel."""
+    import torch
+
+    class VisionTower(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.vision_model = clip_model.vision_model
+            self.visual_projection = clip_model.visual_projection
+
+        def forward(self, pixel_values):
+            pooled = self.vision_model(pixel_values=pixel_values, return_dict=False)[1]
+            return self.visual_projection(pooled)
+
+    return VisionTower().eval()
+
+
+class ClipImageEncoder:
+    """Runs an exported CLIP vision tower. encode() matches SentenceTransformer.encode for images."""
+
+    def __init__(self, backend: str, run, processor, model_path: Path | None = None):
+        self.backend = backend
+        self.model_path = model_path  # exported model file, None if built in memory (bf16)
+        self._run = run
+        self._processor = processor
+
+    def encode(self, images, batch_size: int = BATCH_SIZE, show_progress_bar: bool = False) -> np.ndarray:
+        out = []
+        for i in range(0, len(images), batch_size):
+            pixel_values = self._processor(images=images[i : i + batch_size], return_tensors="np")["pixel_values"]
+            out.append(self._run(pixel_values.astype(np.float32)))
+        return np.vstack(out)
+
+
+def _bf16_supported() -> bool:
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def export_encoder(backend: str, st_model) -> ClipImageEncoder:
+    """Build (or load from MODELS_DIR) the optimized image encoder for a backend."""
+    import torch
+
+    clip = st_model[0]
+    processor = clip.processor
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    example = torch.zeros(1, 3, 224, 224)
+    path = None
+
+    if backend == "int8":
+        path = MODELS_DIR / f"{MODEL_NAME}-vision-int8.pt"
+        if not path.exists():
+            print(f"Exporting int8 TorchScript encoder to {path}")
+            quantized = torch.ao.quantization.quantize_dynamic(_vision_tower(clip.model), {torch.nn.Linear}, dtype=torch.qint8)
+            with torch.inference_mode():
+                torch.jit.save(torch.jit.trace(quantized, example), str(path))
+        module = torch.jit.load(str(path)).eval()
+
+        def run(pixel_values):
+            with torch.inference_mode():
+                return module(torch.from_numpy(pixel_values)).numpy()
+
+    elif backend == "bf16":
+        tower = _vision_tower(clip.model)
+
+        def run(pixel_values):
+            with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16):
+                return tower(torch.from_numpy(pixel_values)).float().numpy()
+
+    elif backend == "onnx-int8":
+        import onnxruntime as ort
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        path = MODELS_DIR / f"{MODEL_NAME}-vision-int8.onnx"
+        if not path.exists():
+            fp32_path = MODELS_DIR / f"{MODEL_NAME}-vision-fp32.onnx"
+            print(f"Exporting ONNX encoder to {fp32_path}")
+            torch.onnx.export(
+                _vision_tower(clip.model),
+                example,
+                str(fp32_path),
+                input_names=["pixel_values"],
+                output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=17,
+            )
+            print(f"Quantizing to {path}")
+            quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+            fp32_path.unlink()
+        session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+
+        def run(pixel_values):
+            return session.run(None, {"pixel_values": pixel_values})[0]
+
+    else:
+        raise ValueError(f"Unknown encoder backend: {backend}")
+
+    return ClipImageEncoder(backend, run, processor, path)
+
+
+def model_fingerprint(path: Path | None) -> str | None:
+    """Identifies an exported model file, so a re-exported model is validated again."""
+    if path is None:
+        return None
+    stat = path.stat()
+    return f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def validate_encoder(encoder, reference, image_paths: list[str]) -> dict | None:
+    """Compare an encoder with the fp32 model on sample images (cosine similarity and speed).
+    Unreadable samples are skipped; None if none could be read."""
+    images = []
+    for p in image_paths:
+        try:
+            images.append(open_image(p))
+        except Exception as e:
+            print(f"  Skip {p}: {e}")
+    if not images:
+        return None
+    t0 = time.perf_counter()
+    expected = reference.encode(images, batch_size=BATCH_SIZE, show_progress_bar=False)
+    t1 = time.perf_counter()
+    actual = encoder.encode(images, batch_size=BATCH_SIZE)
+    t2 = time.perf_counter()
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1) + 1e-12
+    )
+    return {
+        "images": len(images),
+        "min_cosine": round(float(cosine.min()), 5),
+        "mean_cosine": round(float(cosine.mean()), 5),
+        "threshold": COSINE_THRESHOLD,
+        "model": model_fingerprint(encoder.model_path),
+        "speedup": round((t1 - t0) / max(t2 - t1, 1e-9), 2),
+        "passed": bool(cosine.min() >= COSINE_THRESHOLD),
+    }
+
+
+def load_encoder(backend: str = ENCODER_BACKEND, sample_paths: list[str] | None = None):
+    """Model with an encode() method for the selected backend, falling back to fp32
+    when the backend fails validation (or cannot be validated yet)."""
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Loading model: {MODEL_NAME}")
+    model = SentenceTransformer(MODEL_NAME, device="cpu" if backend != "torch" else None)
+    if backend == "torch":
+        return model
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "bf16" and not _bf16_supported():
+        print("This CPU has no native bfloat16 support, using the fp32 model.")
+        return model
+
+    encoder = export_encoder(backend, model)
+
+    report_path = MODELS_DIR / f"{MODEL_NAME}-{backend}-validation.json"
+    report = None
+    if report_path.exists():
+        with open(report_path) as f:
+            report = json.load(f)
+    if (report is None or report["threshold"] != COSINE_THRESHOLD
+            or report.get("model") != model_fingerprint(encoder.model_path)):
+        if not sample_paths:
+            print(f"Backend {backend} is not validated yet and there are no sample images, using the fp32 model.")
+            return model
+        # Spread the sample over the whole list rather than the first minutes of one day
+        step = max(1, len(sample_paths) // VALIDATION_IMAGES)
+        report = validate_encoder(encoder, model, sample_paths[::step][:VALIDATION_IMAGES])
+        if report is None:
+            print(f"None of the sample images could be read to validate {backend}, using the fp32 model.")
+            return model
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Validated {backend} on {report['images']} images: min cosine {report['min_cosine']}, "
+              f"mean {report['mean_cosine']}, {report['speedup']}x faster than fp32")
+
+    if not report["passed"]:
+        print(f"Backend {backend} is below the cosine threshold ({report['min_cosine']} < {COSINE_THRESHOLD}), "
+              "using the fp32 model.")
+        return model
+    print(f"Using the {backend} image encoder.")
+    return encoder
+
+
 def encode_batch(model, image_paths: list[str]) -> tuple[np.ndarray, list[str]]:
     """Load and encode a batch of images. Skips images that fail to load."""
     images = []
     valid_paths = []
     for p in image_paths:
         try:
-            img = Image.open(p).convert("RGB")
+            img = open_image(p)
             images.append(img)
             valid_paths.append(p)
         except Exception as e:
             print(f"  Skip {p}: {e}")
+            profiling.count("skipped_images")
     if not images:
         return np.array([]), []
-    embeddings = model.encode(images, batch_size=BATCH_SIZE, show_progress_bar=False)
+    with profiling.stage("model_encode"):
+        embeddings = model.encode(images, batch_size=BATCH_SIZE, show_progress_bar=False)
+    profiling.count("images_encoded", len(images))
     return embeddings, valid_paths
 
 
+def save_embeddings(output_dir: Path, date: str, embeddings: np.ndarray, paths: list[str]):
+    """Append embeddings to the date's .npz file (created if missing)."""
+    out_file = output_dir / f"{date}.npz"
+
+    # If file exists, merge with existing data
+    if out_file.exists():
+        existing = np.load(out_file, allow_pickle=True)
+        embeddings = np.vstack([existing["embeddings"], embeddings])
+        paths = existing["paths"].tolist() + paths
+
+    np.savez_compressed(
+        out_file,
+        embeddings=embeddings,
+        paths=np.array(paths),
+    )
+    print(f"  Saved {len(paths)} embeddings to {out_file}")
+
+
 def main():
     output_dir = OUTPUT_DIR
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -64,16 +319,15 @@ def main():
 
     # Check what's already been processed
     already_done = load_existing(output_dir)
-    new_paths = [p for p in all_paths if p not in already_done]
+    new_paths = [p for p in all_paths if screenshot_key(p) not in already_done]
     print(f"Already processed: {len(already_done)}, New: {len(new_paths)}")
 
     if not new_paths:
         print("Nothing new to process.")
         return
 
-    # Load model
-    print(f"Loading model: {MODEL_NAME}")
-    model = SentenceTransformer(MODEL_NAME)
+    # Load model (torch is only imported here, so other tools can reuse this module's paths)
+    model = load_encoder(ENCODER_BACKEND, new_paths)
     print("Model loaded.")
 
     # Process in batches, save per date folder
@@ -99,21 +353,7 @@ def main():
                 all_valid_paths.extend(valid)
 
         if all_valid_paths:
-            embeddings = np.vstack(all_embeddings)
-            out_file = output_dir / f"{date}.npz"
-
-            # If file exists, merge with existing data
-            if out_file.exists():
-                existing = np.load(out_file, allow_pickle=True)
-                embeddings = np.vstack([existing["embeddings"], embeddings])
-                all_valid_paths = existing["paths"].tolist() + all_valid_paths
-
-            np.savez_compressed(
-                out_file,
-                embeddings=embeddings,
-                paths=np.array(all_valid_paths),
-            )
-            print(f"  Saved {len(all_valid_paths)} embeddings to {out_file}")
+            save_embeddings(output_dir, date, np.vstack(all_embeddings), all_valid_paths)
 
     print("\nDone!")
 
@@ -2,19 +2,67 @@
 
 import uvicorn
 from fastapi import FastAPI, Header, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+import bisect
 import ipaddress
+import json
 from dotenv import load_dotenv
 import os
+import time
+from typing import Optional
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+STATS_PATH = os.path.join(script_dir, "capture_stats.json")
+
+# Upper bounds (seconds) of the latency histogram buckets, the collector gives up after 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METERED_PATHS = ("/photo", "/metrics")
+
 app = FastAPI()
 
 
+class RequestMetrics:
+	"""Per-path latency histogram, status counts and bytes served.
+
+	Everything runs on the event loop, so plain counters are enough (no locks).
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+		self.latency_sum = 0.0
+		self.latency_count = 0
+		self.bytes_served = 0
+		self.status_counts = {}
+
+	def observe(self, status, seconds, sent):
+		index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+		if index < len(self.bucket_counts):
+			self.bucket_counts[index] += 1
+		self.latency_sum += seconds
+		self.latency_count += 1
+		self.bytes_served += sent
+		self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+request_metrics = {path: RequestMetrics(path) for path in METERED_PATHS + ("other",)}
+
+
+async def metered_body(body_iterator, metrics, status, start):
+	# Latency is measured until the last byte is handed to the server, not just until the headers
+	sent = 0
+	try:
+		async for chunk in body_iterator:
+			sent += len(chunk)
+			yield chunk
+	finally:
+		metrics.observe(status, time.perf_counter() - start, sent)
+
+
 @app.middleware("http")
 async def verify_client_ip(request, call_next):
 	# Extract client IP address
@@ -27,21 +75,86 @@ async def verify_client_ip(request, call_next):
 	except ValueError:
 		raise HTTPException(status_code=400, detail="Invalid IP address")
 	
+	start = time.perf_counter()
 	response = await call_next(request)
+	path = request.url.path if request.url.path in METERED_PATHS else "other"
+	response.body_iterator = metered_body(response.body_iterator, request_metrics[path], response.status_code, start)
 	return response
 
 
 @app.get("/photo")
-async def get_photo(x_api_key: str = Header(...)):
+async def get_photo(x_api_key: str = Header(...), if_none_match: Optional[str] = Header(None)):
 	# Verify API key
 	if x_api_key != API_KEY:
 		raise HTTPException(status_code=403, detail="Invalid API key")
 	
 	file_path = os.path.join(script_dir, "photo.jpg")
 	try:
-		return FileResponse(file_path, media_type="image/jpeg", filename="photo.jpg")
+		stat = os.stat(file_path)
 	except FileNotFoundError:
 		raise HTTPException(status_code=404, detail="File not found")
+	# take_photo.py replaces photo.jpg atomically, so mtime and size identify a frame
+	etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+	if if_none_match == etag:
+		return Response(status_code=304, headers={"ETag": etag})
+	return FileResponse(file_path, media_type="image/jpeg", filename="photo.jpg", headers={"ETag": etag})
+
+
+
+def read_capture_stats():
+	try:
+		with open(STATS_PATH) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+@app.get("/metrics")
+async def get_metrics():
+	"""Prometheus text format. Cheap enough to scrape every few seconds on a Pi Zero."""
+	lines = ["# TYPE photo_http_request_duration_seconds histogram"]
+	for path, metrics in request_metrics.items():
+		cumulative = 0
+		for bound, count in zip(LATENCY_BUCKETS, metrics.bucket_counts):
+			cumulative += count
+			lines.append(f'photo_http_request_duration_seconds_bucket{{path="{path}",le="{bound}"}} {cumulative}')
+		lines.append(f'photo_http_request_duration_seconds_bucket{{path="{path}",le="+Inf"}} {metrics.latency_count}')
+		lines.append(f'photo_http_request_duration_seconds_sum{{path="{path}"}} {metrics.latency_sum:.6f}')
+		lines.append(f'photo_http_request_duration_seconds_count{{path="{path}"}} {metrics.latency_count}')
+
+	lines.append("# TYPE photo_http_requests_total counter")
+	for path, metrics in request_metrics.items():
+		for status, count in sorted(metrics.status_counts.items()):
+			lines.append(f'photo_http_requests_total{{path="{path}",status="{status}"}} {count}')
+
+	lines.append("# TYPE photo_http_bytes_served_total counter")
+	for path, metrics in request_metrics.items():
+		lines.append(f'photo_http_bytes_served_total{{path="{path}"}} {metrics.bytes_served}')
+
+	try:
+		frame_age = time.time() - os.stat(os.path.join(script_dir, "photo.jpg")).st_mtime
+		lines.append("# TYPE photo_frame_age_seconds gauge")
+		lines.append(f"photo_frame_age_seconds {frame_age:.3f}")
+	except OSError:
+		pass
+
+	stats = read_capture_stats()
+	if stats is not None:
+		lines.append("# TYPE photo_captures_total counter")
+		lines.append(f"photo_captures_total {stats['captures_total']}")
+		lines.append("# TYPE photo_capture_errors_total counter")
+		lines.append(f"photo_capture_errors_total {stats['errors_total']}")
+		lines.append("# TYPE photo_capture_last_success_timestamp_seconds gauge")
+		lines.append(f"photo_capture_last_success_timestamp_seconds {stats['last_success']:.3f}")
+		lines.append("# TYPE photo_capture_stage_seconds summary")
+		for name, stage in stats["stages"].items():
+			lines.append(f'photo_capture_stage_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+			lines.append(f'photo_capture_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+		lines.append("# TYPE photo_capture_stage_last_seconds gauge")
+		for name, stage in stats["stages"].items():
+			lines.append(f'photo_capture_stage_last_seconds{{stage="{name}"}} {stage["last"]:.6f}')
+
+	return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
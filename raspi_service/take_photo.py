@@ -3,15 +3,46 @@
 # filename: take_photo.py
 # This file is for taking photos continuously in the background.
 
+import json
 import os
 import time
 from picamera2 import Picamera2
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Capture timings are shared with main.py (the /metrics endpoint) through this file
+STATS_PATH = os.path.join(script_dir, "capture_stats.json")
+STAGES = ("mode_switch", "capture", "rename")
+
+stats = {
+    "captures_total": 0,
+    "errors_total": 0,
+    "last_success": 0.0,
+    "last_error": "",
+    "stages": {name: {"last": 0.0, "sum": 0.0, "count": 0} for name in STAGES},
+}
+
+
+def record_stage(name, seconds):
+    stage = stats["stages"][name]
+    stage["last"] = seconds
+    stage["sum"] += seconds
+    stage["count"] += 1
+
+
+def write_stats():
+    # Same trick as the photo: write to a temp file and rename it into place,
+    # so the HTTP service never reads a half-written file
+    temp_stats = STATS_PATH + ".tmp"
+    with open(temp_stats, "w") as f:
+        json.dump(stats, f)
+    os.replace(temp_stats, STATS_PATH)
+
+
 picam2 = Picamera2()
 capture_config = picam2.create_still_configuration()
 picam2.start()
+preview_config = picam2.camera_config
 
 print("Camera started. Begin loop for taking photos.")
 
@@ -23,15 +54,34 @@ while True:
         # Sleep for a short time to calibrate the camera
         time.sleep(2)
 
-        picam2.switch_mode_and_capture_file(capture_config, temp_path)
+        # Same as switch_mode_and_capture_file, split up so each step can be timed
+        t0 = time.perf_counter()
+        picam2.switch_mode(capture_config)
+        t1 = time.perf_counter()
+        picam2.capture_file(temp_path)
+        t2 = time.perf_counter()
+        picam2.switch_mode(preview_config)
+        t3 = time.perf_counter()
+        record_stage("mode_switch", (t1 - t0) + (t3 - t2))
+        record_stage("capture", t2 - t1)
 
         # atomic rename to avoid reading and writing at the same time
         os.rename(temp_path, final_path)
+        record_stage("rename", time.perf_counter() - t3)
 
+        stats["captures_total"] += 1
+        stats["last_success"] = time.time()
         print("Photo taken.")
 
     except Exception as e:
+        stats["errors_total"] += 1
+        stats["last_error"] = str(e)
         print(f"Error: {e}")
 
+    try:
+        write_stats()
+    except OSError as e:
+        print(f"Error writing stats: {e}")
+
     # Sleep for 20 seconds
     time.sleep(20)